@@ -0,0 +1,280 @@
+"""Bulk historical Gameday backfill over a range of dates
+
+Each day's listing, master scoreboard and per-game detail files are
+fetched by one bounded thread pool through one `HttpClient`, which limits
+every host to a fixed request rate; a day's detail files go into the same
+pool as soon as its scoreboard is in. A fetched day is written as a single
+compressed archive (`{out_dir}/{year}/{YYYY-MM-DD}.zip`), and once all of
+its games are over it's recorded in a checkpoint file, so an interrupted
+run picks up with the first unfinished day.
+"""
+import json
+import os
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Set, Text, Tuple
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import attr
+import requests
+from lxml import etree  # type: ignore
+from requests import Session
+
+from baseball_utils.column_store import ColumnStore
+from baseball_utils.gameday import (
+    GD_BASE,
+    INNING_FILE,
+    GamedayError,
+    day_url,
+    final_after,
+    master_url,
+)
+from baseball_utils.gameday_async import DETAIL_FILES
+from baseball_utils.gameday_pitches import PitchTable, store_pitches
+from baseball_utils.gameday_xml import GameRecord, iter_scoreboard
+from baseball_utils.http_client import HttpClient
+from baseball_utils.types import Path
+from baseball_utils.util import date_range, default_attrs
+
+MASTER_NAME = 'master_scoreboard.xml'
+
+
+def data_dir_name(game: GameRecord) -> Text:
+    """Name of a game's data directory ('gid_...'), used in day archives"""
+    return game.game_data_directory.rstrip('/').rsplit('/', 1)[-1]
+
+
+def day_is_final(day: date, games: List[GameRecord]) -> bool:
+    """Whether a day's data can't change any more
+
+    True once every game is over, or (so postponed games and days without
+    any don't hold it open forever) once the day is past `final_after`.
+    """
+    if games and all(game.status.is_final for game in games):
+        return True
+    return time.time() >= final_after(day)
+
+
+@default_attrs()
+class DayFetch(object):
+    """A day being fetched by `Backfill.run`"""
+
+    day: date = attr.ib()
+    files: Dict[Text, bytes] = attr.ib(factory=dict, repr=False)
+    games: List[GameRecord] = attr.ib(factory=list, repr=False)
+    waiting: int = attr.ib(default=0)  # detail files still being fetched
+
+
+@default_attrs()
+class Backfill(object):
+    out_dir: Path = attr.ib()
+    workers: int = attr.ib(default=8)
+    rate: float = attr.ib(default=10.0)  # requests per second, per host
+    files: Tuple[Text, ...] = attr.ib(default=DETAIL_FILES)
+    gd_base: Text = attr.ib(default=GD_BASE)
+    session: Session = attr.ib(
+        default=attr.Factory(
+            lambda self: HttpClient(
+                pool_size=self.workers, rates={}, default_rate=self.rate
+            ),
+            takes_self=True,
+        ),
+        repr=False,
+    )
+
+    @property
+    def checkpoint_file(self) -> Path:
+        return os.path.join(self.out_dir, 'checkpoint.json')
+
+    def day_file(self, day: date) -> Path:
+        return os.path.join(
+            self.out_dir, str(day.year), '{0}.zip'.format(day.isoformat())
+        )
+
+    def load_checkpoint(self) -> Set[Text]:
+        if not os.path.isfile(self.checkpoint_file):
+            return set()
+        with open(self.checkpoint_file, encoding='utf-8') as f:
+            return set(json.load(f)['done'])
+
+    def save_checkpoint(self, done: Set[Text]) -> None:
+        if not os.path.isdir(self.out_dir):
+            os.makedirs(self.out_dir)
+        tmp = self.checkpoint_file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'done': sorted(done)}, f, indent=1)
+        os.replace(tmp, self.checkpoint_file)
+
+    def get(self, url: Text) -> Optional[bytes]:
+        """GET a URL under its host's rate limit (None if it's not there)"""
+        res = self.session.get(url)
+        if res.status_code == 404:
+            return None
+        res.raise_for_status()
+        return res.content
+
+    def fetch_master(self, day: date) -> DayFetch:
+        """A day's master scoreboard and its games (none without one)"""
+        ret = DayFetch(day)
+        url = day_url(day, self.gd_base)
+        listing = self.get(url)
+        if listing is None:
+            return ret
+        try:
+            master = self.get(master_url(url, listing))
+        except GamedayError:
+            return ret
+        if master is not None:
+            ret.files[MASTER_NAME] = master
+            ret.games = list(iter_scoreboard(master))
+        return ret
+
+    def detail_urls(self, games: List[GameRecord]) -> Dict[Text, Text]:
+        """URL of each of the games' detail files, by name in the archive"""
+        ret = dict()
+        for game in games:
+            gid = data_dir_name(game)
+            if not gid:
+                continue
+            folder = game.game_data_directory
+            for name in self.files:
+                ret[gid + '/' + name] = self.gd_base + folder + '/' + name
+        return ret
+
+    def fetch_day(self, day: date) -> Dict[Text, bytes]:
+        """Every file for one day, keyed by its name in the day's archive"""
+        fetch = self.fetch_master(day)
+        urls = self.detail_urls(fetch.games)
+        with ThreadPoolExecutor(self.workers) as pool:
+            bodies = pool.map(self.get, urls.values())
+            for name, body in zip(urls, bodies):
+                if body is not None:
+                    fetch.files[name] = body
+        return fetch.files
+
+    def backfill_day(self, day: date) -> int:
+        """Fetch and store one day; returns the number of files written"""
+        return self.write_day(day, self.fetch_day(day))
+
+    def write_day(self, day: date, files: Dict[Text, bytes]) -> int:
+        """Store a day's files as its archive; returns how many there were"""
+        if not files:
+            return 0
+        path = self.day_file(day)
+        folder = os.path.dirname(path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        tmp = path + '.tmp'
+        with ZipFile(tmp, 'w', ZIP_DEFLATED) as z:
+            for name, body in files.items():
+                z.writestr(name, body)
+        os.replace(tmp, path)
+        return len(files)
+
+    def run(self, start: date, end: date, verbose: bool = False) -> List[date]:
+        """Backfill every day from start to end that isn't checkpointed yet
+
+        Scoreboards and detail files all go through one pool, so a day's
+        games are fetched side by side (and alongside other days). A day
+        that fails isn't stored; one whose games aren't all over yet is
+        stored but left out of the checkpoint. Either is fetched again on
+        the next run. Returns the days completed by this run.
+        """
+        done = self.load_checkpoint()
+        todo = [d for d in date_range(start, end) if d.isoformat() not in done]
+        completed: List[date] = []
+        failed: Set[date] = set()
+        # Each future is a day's scoreboard (name None) or one detail file
+        pending: Dict[Future, Tuple[DayFetch, Optional[Text]]] = dict()
+
+        def finish(fetch: DayFetch) -> None:
+            day = fetch.day
+            n = self.write_day(day, fetch.files)
+            if not day_is_final(day, fetch.games):
+                if verbose:
+                    print('{0} ({1} files, not final)'.format(day, n))
+                return
+            if verbose:
+                print('{0} ({1} files)'.format(day, n))
+            done.add(day.isoformat())
+            completed.append(day)
+            self.save_checkpoint(done)
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            for day in todo:
+                master = pool.submit(self.fetch_master, day)
+                pending[master] = (DayFetch(day), None)
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    fetch, name = pending.pop(fut)
+                    if fetch.day in failed:
+                        continue
+                    try:
+                        if name is None:
+                            fetch = fut.result()
+                            urls = self.detail_urls(fetch.games)
+                            fetch.waiting = len(urls)
+                            for key, url in urls.items():
+                                detail = pool.submit(self.get, url)
+                                pending[detail] = (fetch, key)
+                        else:
+                            body = fut.result()
+                            if body is not None:
+                                fetch.files[name] = body
+                            fetch.waiting -= 1
+                        if not fetch.waiting:
+                            finish(fetch)
+                    except (
+                        requests.RequestException,
+                        OSError,
+                        etree.XMLSyntaxError,
+                    ) as e:
+                        failed.add(fetch.day)
+                        if verbose:
+                            print('{0} failed: {1}'.format(fetch.day, e))
+        return sorted(completed)
+
+    def load_day(self, day: date) -> Dict[Text, bytes]:
+        """Every stored file for a day (empty if there were no games)"""
+        path = self.day_file(day)
+        if not os.path.isfile(path):
+            return dict()
+        with ZipFile(path) as z:
+            return {name: z.read(name) for name in z.namelist()}
+
+    def scoreboards(
+        self, start: date, end: date
+    ) -> Iterator[Tuple[date, List[GameRecord]]]:
+        """Stored scoreboards for a range of days, as typed records"""
+        for day in date_range(start, end):
+            path = self.day_file(day)
+            if not os.path.isfile(path):
+                continue
+            with ZipFile(path) as z:
+                yield day, list(iter_scoreboard(z.read(MASTER_NAME)))
+
+    def pitch_tables(self, start: date, end: date) -> Iterator[PitchTable]:
+        """Pitches of every stored finished game in a range of days"""
+        for day in date_range(start, end):
+            path = self.day_file(day)
+            if not os.path.isfile(path):
+                continue
+            with ZipFile(path) as z:
+                names = set(z.namelist())
+                for game in iter_scoreboard(z.read(MASTER_NAME)):
+                    name = data_dir_name(game) + '/' + INNING_FILE
+                    if game.status.is_final and name in names:
+                        yield PitchTable.from_xml(game.id, z.read(name))
+
+    def store_pitches(
+        self, store: ColumnStore, start: date, end: date
+    ) -> int:
+        """Append stored pitches for a range of days to a pitch store"""
+        return store_pitches(store, self.pitch_tables(start, end))
@@ -0,0 +1,384 @@
+"""Caches: raw HTTP responses on disk, and stores for CachedValue
+
+The CachedValue stores (`MemoryCache`, `FileCache`, `SQLiteCache`) share
+one interface, `CacheBackend`. The file and SQLite stores can be shared
+by every process on a host, so one upstream fetch serves all of them.
+"""
+import abc
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Optional, Text, cast
+
+import attr
+import requests
+from requests import Session
+
+from baseball_utils.types import Path
+from baseball_utils.util import default_attrs, frozen_attrs
+
+CACHE_DIR = os.environ.get(
+    'BASEBALL_UTILS_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'baseball_utils'),
+)
+
+
+@default_attrs()
+class DiskCache(object):
+    """Response bodies stored one file per key, aged by file mtime
+
+    A max_age of None means the entry never expires. For data that stops
+    changing at some point (e.g. a day's games once they're all over), pass
+    that time as final_after instead: entries written after it never
+    expire, and older ones (possibly from while it was still changing) get
+    max_age like any other.
+    """
+
+    root: Path = attr.ib(default=os.path.join(CACHE_DIR, 'http'))
+
+    def path(self, key: Text) -> Path:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest[:2], digest)
+
+    def get(
+        self,
+        key: Text,
+        max_age: Optional[timedelta] = None,
+        final_after: Optional[float] = None,
+    ) -> Optional[bytes]:
+        """
+        :param final_after: time.time() after which the content is final
+        """
+        path = self.path(key)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        if final_after is not None and mtime >= final_after:
+            pass
+        elif max_age is not None:
+            if time.time() - mtime >= max_age.total_seconds():
+                return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def put(self, key: Text, content: bytes) -> None:
+        path = self.path(key)
+        folder = os.path.dirname(path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+    def delete(self, key: Text) -> None:
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+
+def request_key(url: Text, params: Optional[Dict[Text, Any]] = None) -> Text:
+    """The full URL (with query string) a GET request would be sent to"""
+    prepared = requests.Request('GET', url, params=params).prepare()
+    return cast(Text, prepared.url)
+
+
+def cached_get(
+    session: Session,
+    url: Text,
+    cache: Optional[DiskCache],
+    max_age: Optional[timedelta] = None,
+    params: Optional[Dict[Text, Any]] = None,
+    final_after: Optional[float] = None,
+) -> bytes:
+    """GET a URL's body, going to the network only on a cache miss
+
+    max_age and final_after are as for `DiskCache.get`.
+    """
+    key = request_key(url, params)
+    if cache is not None:
+        content = cache.get(key, max_age, final_after)
+        if content is not None:
+            return content
+
+    res = session.get(url, params=params)
+    res.raise_for_status()
+    if cache is not None:
+        cache.put(key, res.content)
+    return res.content
+
+
+@frozen_attrs()
+class Entry(object):
+    value: Any = attr.ib(repr=False)
+    stored: float = attr.ib()  # time.time() it was stored
+    expires: Optional[float] = attr.ib(default=None)  # None is never
+
+    @property
+    def expired(self) -> bool:
+        return self.expires is not None and time.time() >= self.expires
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.stored
+
+
+@default_attrs()
+class CacheStats(object):
+    hits: int = attr.ib(default=0)
+    misses: int = attr.ib(default=0)
+    _lock: threading.Lock = attr.ib(
+        factory=threading.Lock, init=False, repr=False, eq=False
+    )
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def make_entry(value: Any, ttl: Optional[timedelta]) -> Entry:
+    now = time.time()
+    expires = None if ttl is None else now + ttl.total_seconds()
+    return Entry(value, now, expires)
+
+
+@default_attrs()
+class CacheBackend(abc.ABC):
+    """Where CachedValues keep their values, keyed by name
+
+    Expired entries are still returned by `peek` (so a stale value can be
+    served while it's refreshed); `get` counts only unexpired entries as
+    hits. `claim`/`release` let one of several processes fetch a value
+    while the others wait for it.
+    """
+
+    stats: CacheStats = attr.ib(factory=CacheStats, init=False)
+
+    @abc.abstractmethod
+    def peek(self, key: Text) -> Optional[Entry]:
+        pass
+
+    @abc.abstractmethod
+    def put(self, key: Text, value: Any, ttl: Optional[timedelta]) -> None:
+        pass
+
+    @abc.abstractmethod
+    def delete(self, key: Text) -> None:
+        pass
+
+    def _unpickle(self, key: Text, data: bytes) -> Any:
+        """A stored pickle's value, or None (dropping the entry) if it
+        can't be loaded any more
+        """
+        try:
+            return pickle.loads(data)
+        except Exception:
+            # Truncated, or written by a version whose classes have since
+            # been renamed or changed: treat it as a miss
+            self.delete(key)
+            return None
+
+    def get(self, key: Text) -> Optional[Entry]:
+        entry = self.peek(key)
+        self.stats.record(entry is not None and not entry.expired)
+        return entry
+
+    def claim(self, key: Text, lease: float) -> bool:
+        """Try to become the one process fetching key for lease seconds"""
+        return True
+
+    def release(self, key: Text) -> None:
+        pass
+
+
+@default_attrs()
+class MemoryCache(CacheBackend):
+    """Size-bounded, least recently used in-process store"""
+
+    max_entries: int = attr.ib(default=128)
+    _entries: 'OrderedDict[Text, Entry]' = attr.ib(
+        factory=OrderedDict, init=False, repr=False
+    )
+    _lock: threading.Lock = attr.ib(
+        factory=threading.Lock, init=False, repr=False
+    )
+
+    def peek(self, key: Text) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Text, value: Any, ttl: Optional[timedelta]) -> None:
+        with self._lock:
+            self._entries[key] = make_entry(value, ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Text) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@default_attrs()
+class FileCache(CacheBackend):
+    """One pickle file per key; claims are exclusive lock files"""
+
+    root: Path = attr.ib(default=os.path.join(CACHE_DIR, 'values'))
+
+    def path(self, key: Text) -> Path:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest[:2], digest)
+
+    def peek(self, key: Text) -> Optional[Entry]:
+        try:
+            with open(self.path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        return self._unpickle(key, data)
+
+    def put(self, key: Text, value: Any, ttl: Optional[timedelta]) -> None:
+        path = self.path(key)
+        folder = os.path.dirname(path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        tmp = '{0}.{1}.{2}.tmp'.format(
+            path, os.getpid(), threading.get_ident()
+        )
+        with open(tmp, 'wb') as f:
+            pickle.dump(make_entry(value, ttl), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def delete(self, key: Text) -> None:
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def claim(self, key: Text, lease: float) -> bool:
+        lock = self.path(key) + '.lock'
+        folder = os.path.dirname(lock)
+        if not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        for _ in range(2):
+            try:
+                os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    # Break a lease whose holder never released it
+                    if time.time() - os.path.getmtime(lock) < lease:
+                        return False
+                    os.remove(lock)
+                except OSError:
+                    pass
+        return False
+
+    def release(self, key: Text) -> None:
+        try:
+            os.remove(self.path(key) + '.lock')
+        except OSError:
+            pass
+
+
+@default_attrs()
+class SQLiteCache(CacheBackend):
+    """A single SQLite file shared by every process (and thread) on a host"""
+
+    path: Path = attr.ib(default=os.path.join(CACHE_DIR, 'values.sqlite'))
+    _local: threading.local = attr.ib(
+        factory=threading.local, init=False, repr=False
+    )
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """This thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            folder = os.path.dirname(self.path)
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, value BLOB, stored REAL, expires REAL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS claims ('
+                'key TEXT PRIMARY KEY, until REAL)'
+            )
+            self._local.conn = conn
+        return conn
+
+    def peek(self, key: Text) -> Optional[Entry]:
+        row = self.conn.execute(
+            'SELECT value, stored, expires FROM entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value = self._unpickle(key, row[0])
+        if value is None:
+            return None
+        return Entry(value, row[1], row[2])
+
+    def put(self, key: Text, value: Any, ttl: Optional[timedelta]) -> None:
+        entry = make_entry(value, ttl)
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self.conn.execute(
+            'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+            (key, blob, entry.stored, entry.expires),
+        )
+
+    def delete(self, key: Text) -> None:
+        self.conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def claim(self, key: Text, lease: float) -> bool:
+        conn = self.conn
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT until FROM claims WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and row[0] > now:
+                return False
+            conn.execute(
+                'INSERT OR REPLACE INTO claims VALUES (?, ?)',
+                (key, now + lease),
+            )
+            return True
+        finally:
+            conn.execute('COMMIT')
+
+    def release(self, key: Text) -> None:
+        self.conn.execute('DELETE FROM claims WHERE key = ?', (key,))
+
+    def purge(self) -> int:
+        """Drop expired entries; returns how many there were"""
+        cur = self.conn.execute(
+            'DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?',
+            (time.time(),),
+        )
+        return cur.rowcount
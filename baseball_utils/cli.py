@@ -1,21 +1,55 @@
 from datetime import datetime
+from typing import Optional, Text
 
 import click
 
+from baseball_utils.cache import SQLiteCache
 from baseball_utils.const import FieldingPos
-from baseball_utils.gameday import GamedayData
+from baseball_utils.gameday import GameChange, GamedayData
 from baseball_utils.get_today import Today
+from baseball_utils.http_client import SESSION
 from baseball_utils.savant import Savant
-from baseball_utils.util import SESSION
+
+
+def change_line(change: GameChange) -> Text:
+    game = change.game
+    line = game.linescore
+    away_r, home_r = line.runs if line is not None else (0, 0)
+    half = 'top' if game.status.top_inning else 'bot'
+    return '{0} {1} - {2} {3} ({4}, {5} {6}) [{7}]'.format(
+        game.away_team_name,
+        away_r,
+        game.home_team_name,
+        home_r,
+        game.status.status,
+        half,
+        game.status.inning,
+        ', '.join(sorted(change.changed)),
+    )
 
 
 @click.command()
-def cli():
+@click.option(
+    '--watch',
+    '-w',
+    type=float,
+    default=None,
+    help='Poll every WATCH seconds, printing only games that changed',
+)
+def cli(watch: Optional[float]):
     # click.echo('CLI')
     # td = Today(SESSION)
     click.secho(datetime.today().isoformat(), fg='black', bg='white')
     click.echo('')
-    gd = GamedayData(SESSION, Savant(SESSION))
+    values = SQLiteCache()
+    gd = GamedayData(
+        SESSION, Savant(SESSION, value_cache=values), value_cache=values
+    )
+    if watch is not None:
+        for change in gd.poll(watch):
+            click.echo(change_line(change))
+        return
+
     for elem in gd.linescores():
         click.echo(str(elem))
         click.echo('')
@@ -0,0 +1,307 @@
+"""Append-only, memory-mapped columnar tables on disk
+
+A store is a directory holding one raw binary file per column
+(`{name}.bin`, native byte order) and a `meta.json` with the schema, the
+string tables for coded columns, the list of partitions appended so far
+and a small `info` dict for the store's owner (e.g. sync progress).
+
+Appending a partition only ever adds bytes to the end of each column file
+and then rewrites the (small) metadata, so earlier data is never
+rewritten; a partial append left by a crash is truncated away the next
+time the store is written to.
+"""
+import functools
+import json
+import os
+import threading
+from array import array
+from datetime import date
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Text,
+    Tuple,
+)
+
+import attr
+import numpy as np
+
+from baseball_utils.play_table import Encoder
+from baseball_utils.types import ColumnSchema, Path
+from baseball_utils.util import (
+    default_attrs,
+    parse_date,
+    parse_float,
+    parse_int,
+)
+
+STORE_VERSION = 1
+NO_VALUE = -1  # integer columns' value for a missing field
+EPOCH = date(1970, 1, 1).toordinal()
+
+
+class ColumnStoreError(Exception):
+    pass
+
+
+@default_attrs()
+class ColumnStore(object):
+    """A directory of memory-mapped columns
+
+    :param schema: column name -> NumPy dtype, in column order
+    :param strings: columns that hold integer codes into a string table
+    """
+
+    root: Path = attr.ib()
+    schema: ColumnSchema = attr.ib()
+    strings: Tuple[Text, ...] = attr.ib(default=())
+    _meta: Optional[Dict[Text, Any]] = attr.ib(default=None, repr=False)
+    _lock: threading.Lock = attr.ib(factory=threading.Lock, repr=False)
+
+    @property
+    def meta_file(self) -> Path:
+        return os.path.join(self.root, 'meta.json')
+
+    def column_file(self, name: Text) -> Path:
+        return os.path.join(self.root, '{0}.bin'.format(name))
+
+    @property
+    def meta(self) -> Dict[Text, Any]:
+        if self._meta is None:
+            self._meta = self.load_meta()
+        return self._meta
+
+    def load_meta(self) -> Dict[Text, Any]:
+        schema = {k: np.dtype(v).str for k, v in self.schema.items()}
+        if not os.path.isfile(self.meta_file):
+            return {
+                'version': STORE_VERSION,
+                'schema': schema,
+                'strings': {name: [] for name in self.strings},
+                'rows': 0,
+                'partitions': [],
+                'info': {},
+            }
+        with open(self.meta_file, encoding='utf-8') as f:
+            meta = json.load(f)
+        meta.setdefault('info', {})
+        if meta['version'] != STORE_VERSION or meta['schema'] != schema:
+            raise ColumnStoreError(
+                'schema mismatch for store {0}'.format(self.root)
+            )
+        return meta
+
+    def save_meta(self) -> None:
+        tmp = self.meta_file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_file)
+
+    def __len__(self) -> int:
+        return self.meta['rows']
+
+    @property
+    def partitions(self) -> List[Tuple[Text, int, int]]:
+        """(name, first row, end row) of every partition, in append order"""
+        return [tuple(p) for p in self.meta['partitions']]
+
+    @property
+    def info(self) -> Dict[Text, Any]:
+        """Free-form (JSON) data saved along with the next append (or by
+        `update_info`)
+        """
+        return self.meta['info']
+
+    def has_partition(self, name: Text) -> bool:
+        return any(p[0] == name for p in self.meta['partitions'])
+
+    def values(self, name: Text) -> List[Text]:
+        """The string table for a coded column"""
+        return self.meta['strings'][name]
+
+    def code(self, name: Text, value: Text) -> int:
+        """The code of a string in a coded column (-1 if it's not there)"""
+        try:
+            return self.values(name).index(value)
+        except ValueError:
+            return -1
+
+    def column(self, name: Text) -> np.ndarray:
+        """A read-only, memory-mapped view of every row of a column"""
+        dtype = np.dtype(self.schema[name])
+        rows = len(self)
+        if not rows:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(
+            self.column_file(name), dtype=dtype, mode='r', shape=(rows,)
+        )
+
+    def partition(self, name: Text) -> slice:
+        for part, start, stop in self.partitions:
+            if part == name:
+                return slice(start, stop)
+        raise KeyError(name)
+
+    def append(
+        self,
+        name: Text,
+        columns: Mapping[Text, np.ndarray],
+        strings: Optional[Mapping[Text, Sequence[Text]]] = None,
+        info: Optional[Mapping[Text, Any]] = None,
+    ) -> int:
+        """Append a partition; returns the number of rows added
+
+        Coded columns are given as codes into `strings[column]` and are
+        re-coded into the store's own string tables. `info` is merged into
+        the store's info in the same metadata write as the new rows.
+        """
+        lengths = {len(columns[c]) for c in self.schema}
+        if len(lengths) != 1:
+            raise ColumnStoreError('columns differ in length')
+        rows = lengths.pop()
+
+        with self._lock:
+            if self.has_partition(name):
+                raise ColumnStoreError(
+                    'partition {0} already stored'.format(name)
+                )
+            if not os.path.isdir(self.root):
+                os.makedirs(self.root, exist_ok=True)
+
+            meta = self.meta
+            start = meta['rows']
+            for col, dtype in self.schema.items():
+                values = np.asarray(columns[col])
+                if col in self.strings:
+                    values = self._recode(col, values, (strings or {})[col])
+                self._append_column(col, start, values.astype(dtype))
+
+            meta['rows'] = start + rows
+            meta['partitions'].append([name, start, start + rows])
+            meta['info'].update(info or {})
+            self.save_meta()
+        return rows
+
+    def update_info(self, info: Mapping[Text, Any]) -> None:
+        """Merge into the store's info and save it, without any rows"""
+        with self._lock:
+            if not os.path.isdir(self.root):
+                os.makedirs(self.root, exist_ok=True)
+            self.meta['info'].update(info)
+            self.save_meta()
+
+    def _recode(
+        self, col: Text, codes: np.ndarray, values: Sequence[Text]
+    ) -> np.ndarray:
+        table = self.meta['strings'][col]
+        enc = Encoder()
+        for v in table:
+            enc(v)
+        mapping = np.array([enc(v) for v in values], dtype=np.int64)
+        table[:] = enc.values
+        if not len(mapping):
+            return codes
+        return mapping[codes]
+
+    def _append_column(
+        self, col: Text, start: int, values: np.ndarray
+    ) -> None:
+        path = self.column_file(col)
+        size = start * values.dtype.itemsize
+        with open(path, 'ab') as f:
+            # Drop anything past the last recorded row (an interrupted
+            # append) before adding the new rows
+            if f.tell() != size:
+                f.truncate(size)
+                f.seek(size)
+            values.tofile(f)
+
+
+def _int(value: Text) -> int:
+    return parse_int(value, NO_VALUE)
+
+
+@functools.lru_cache(maxsize=4096)
+def _day(value: Text) -> int:
+    """Days since 1970-01-01 for a 'YYYY-MM-DD' date
+
+    Memoized, since a column holds the same few dates over and over.
+    """
+    try:
+        return parse_date(value[:10]).toordinal() - EPOCH
+    except ValueError:
+        return NO_VALUE
+
+
+class ColumnBuilder(object):
+    """Accumulates rows of text fields straight into typed arrays
+
+    Built for CSV: give it the header, then feed it each row as a list.
+    Floats that don't parse become NaN, integers NO_VALUE, and coded
+    columns get codes into their own string tables.
+    """
+
+    def __init__(
+        self,
+        schema: ColumnSchema,
+        strings: Sequence[Text],
+        header: Sequence[Text],
+        sources: Optional[Mapping[Text, Text]] = None,
+        converters: Optional[Mapping[Text, Callable[[Text], Any]]] = None,
+    ) -> None:
+        """
+        :param sources: header name for columns named differently
+        :param converters: field -> value functions overriding the default
+            for a column's dtype
+        """
+        sources = sources or {}
+        converters = converters or {}
+        index = {name: i for i, name in enumerate(header)}
+        self.schema = schema
+        self.encoders: Dict[Text, Encoder] = dict()
+        self.arrays: Dict[Text, array] = dict()
+        self.fields: List[Tuple[int, Callable[[Text], Any], array]] = []
+        for name, dtype in schema.items():
+            kind = np.dtype(dtype).kind
+            if name in strings:
+                enc = self.encoders[name] = Encoder()
+                conv: Callable[[Text], Any] = enc
+            elif name in converters:
+                conv = converters[name]
+            elif kind == 'f':
+                conv = parse_float
+            elif kind == 'M':
+                conv = _day
+            else:
+                conv = _int
+            typecode = {'f': 'd', 'M': 'q', 'b': 'b'}.get(kind, 'q')
+            arr = self.arrays[name] = array(typecode)
+            col = sources.get(name, name)
+            if col not in index:
+                raise ColumnStoreError('no {0} column'.format(col))
+            self.fields.append((index[col], conv, arr))
+
+    def add(self, row: Sequence[Text]) -> None:
+        for i, conv, arr in self.fields:
+            arr.append(conv(row[i]))
+
+    def __len__(self) -> int:
+        return len(self.fields[0][2]) if self.fields else 0
+
+    def columns(self) -> Dict[Text, np.ndarray]:
+        ret = dict()
+        for name, dtype in self.schema.items():
+            arr = self.arrays[name]
+            values = np.frombuffer(arr, dtype=arr.typecode)
+            if np.dtype(dtype).kind == 'M':
+                values = values.view('M8[D]')
+            ret[name] = values.astype(dtype)
+        return ret
+
+    def strings(self) -> Dict[Text, List[Text]]:
+        return {name: enc.values for name, enc in self.encoders.items()}
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import FrozenSet, Text, ClassVar
+from typing import ClassVar, Dict, FrozenSet, Text, Tuple
 
 from baseball_utils.types import FPDictType
 from baseball_utils.util import make_frozen
@@ -111,6 +111,42 @@ class Retrosheet(object):
         'X',
         'Y',
     )
+    # Basic play codes, longest first so prefixes match correctly
+    event_codes: ClassVar[Tuple[Text, ...]] = (
+        'POCS',
+        'DGR',
+        'FLE',
+        'BK',
+        'CS',
+        'DI',
+        'FC',
+        'HP',
+        'HR',
+        'IW',
+        'NP',
+        'OA',
+        'PB',
+        'PO',
+        'SB',
+        'WP',
+        'C',
+        'D',
+        'E',
+        'H',
+        'I',
+        'K',
+        'S',
+        'T',
+        'W',
+    )
+    hit_codes: ClassVar[Dict[Text, int]] = {
+        'S': 1,
+        'D': 2,
+        'DGR': 2,
+        'T': 3,
+        'H': 4,
+        'HR': 4,
+    }
     # ID record fields
     team_s: ClassVar[slice] = slice(3)
     assert team_s.stop is not None
@@ -120,10 +156,22 @@ class Retrosheet(object):
     assert month_s.stop is not None
     day_s = slice(month_s.stop, month_s.stop + 2)
     assert day_s.stop is not None
+    num_s: ClassVar[slice] = slice(day_s.stop, day_s.stop + 1)
     eve_base = 'http://www.retrosheet.org/events'
+    event_exts: ClassVar[Tuple[Text, ...]] = ('.EVA', '.EVN')
+    encoding: ClassVar[Text] = 'latin-1'
 
     years: ClassVar[range] = range(1921, datetime.today().year)
 
+    @classmethod
+    def game_date(cls, game_id: Text) -> datetime:
+        """Date of a game from its id (raises ValueError if malformed)"""
+        return datetime(
+            int(game_id[cls.year_s]),
+            int(game_id[cls.month_s]),
+            int(game_id[cls.day_s]),
+        )
+
     @classmethod
     def event_url(cls, year: int) -> Text:
         assert year in cls.years
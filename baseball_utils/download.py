@@ -1,39 +1,196 @@
 """Download retrosheet/gameday files"""
+import enum
+import json
 import os
-from typing import Text, Optional, List
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Mapping, Optional, Text, Tuple
 from zipfile import ZipFile
 
 import requests
+from requests import Session
 
 from .const import Retrosheet
+from .http_client import RETRY_STATUS, SESSION, HttpClient
 from .types import Path
 
 
+class DownloadError(Exception):
+    pass
+
+
+CHUNK_SIZE = 1 << 16
+TIMEOUT = 30.0
+
+
+@enum.unique
+class Fetched(enum.Enum):
+    """What `fetch_resumable` did; only FAILED is falsy"""
+
+    FAILED = 0
+    DOWNLOADED = 1
+    NOT_MODIFIED = 2  # the file we had is current and was left alone
+
+    def __bool__(self) -> bool:
+        return self is not Fetched.FAILED
+
+
+def make_session(pool_size: int = 8) -> Session:
+    """A client whose connection pools can serve pool_size threads"""
+    return HttpClient(pool_size=pool_size)
+
+
+def validators_path(path: Path) -> Path:
+    """Where the HTTP cache validators for a downloaded file are kept"""
+    return path + '.http.json'
+
+
+def load_validators(path: Path) -> Dict[Text, Text]:
+    vpath = validators_path(path)
+    if not os.path.isfile(vpath):
+        return dict()
+    with open(vpath, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_validators(path: Path, headers: Mapping[Text, Text]) -> None:
+    """Keep the ETag/Last-Modified of a response next to its file"""
+    v = {k: headers[k] for k in ('ETag', 'Last-Modified') if k in headers}
+    vpath = validators_path(path)
+    if v:
+        with open(vpath, 'w', encoding='utf-8') as f:
+            json.dump(v, f)
+    elif os.path.isfile(vpath):
+        os.remove(vpath)
+
+
+def fetch_resumable(
+    url: Text,
+    out_file: Path,
+    session: Optional[Session] = None,
+    retries: int = 4,
+    backoff: float = 0.5,
+    verbose: bool = False,
+) -> Fetched:
+    """Download url to out_file, resuming a partial download if possible
+
+    Data is written to out_file + '.part', which is continued with an HTTP
+    Range request on the next attempt (or run) and only renamed once
+    complete. Connection errors, 429 and 5xx responses are retried with
+    exponential backoff; any other failure status gives up immediately.
+
+    The response's ETag/Last-Modified are stored next to the file, and if
+    out_file already exists the request is made conditional, so an
+    unchanged file costs a single 304 and is left untouched.
+    """
+    session = session if session is not None else SESSION
+    part = out_file + '.part'
+    for attempt in range(retries + 1):
+        have = os.path.getsize(part) if os.path.isfile(part) else 0
+        headers: Dict[Text, Text] = dict()
+        if have:
+            headers['Range'] = 'bytes={0}-'.format(have)
+            # Only continue the partial file if it's still the same version
+            v = load_validators(part)
+            if_range = v.get('ETag') or v.get('Last-Modified')
+            if if_range:
+                headers['If-Range'] = if_range
+        elif os.path.isfile(out_file):
+            v = load_validators(out_file)
+            if 'ETag' in v:
+                headers['If-None-Match'] = v['ETag']
+            if 'Last-Modified' in v:
+                headers['If-Modified-Since'] = v['Last-Modified']
+        try:
+            with session.get(
+                url, headers=headers, stream=True, timeout=TIMEOUT
+            ) as res:
+                if res.status_code == 304:
+                    if verbose:
+                        print('{0} not modified'.format(url))
+                    return Fetched.NOT_MODIFIED
+                if res.status_code == 416:
+                    # Either we already have all of it or the file shrank
+                    total = res.headers.get('Content-Range', '').split('/')[-1]
+                    if total.isdigit() and int(total) == have:
+                        break
+                    os.remove(part)
+                    raise DownloadError('bad range for {0}'.format(url))
+                if res.status_code in RETRY_STATUS:
+                    raise DownloadError(
+                        '{0} returned {1}'.format(url, res.status_code)
+                    )
+                if res.status_code not in (200, 206):
+                    if verbose:
+                        print(
+                            'Failed on {0} with code {1}'.format(
+                                url, res.status_code
+                            )
+                        )
+                    return Fetched.FAILED
+
+                start = have if res.status_code == 206 else 0
+                if not start:
+                    save_validators(part, res.headers)
+                length = res.headers.get('Content-Length')
+                with open(part, 'ab' if start else 'wb') as f:
+                    for chunk in res.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                if length is not None:
+                    if os.path.getsize(part) != start + int(length):
+                        raise DownloadError('short read for {0}'.format(url))
+            break
+        except (requests.RequestException, DownloadError) as e:
+            if attempt == retries:
+                if verbose:
+                    print('Giving up on {0}: {1}'.format(url, e))
+                return Fetched.FAILED
+            time.sleep(backoff * 2 ** attempt)
+
+    os.replace(part, out_file)
+    if os.path.isfile(validators_path(part)):
+        os.replace(validators_path(part), validators_path(out_file))
+    return Fetched.DOWNLOADED
+
+
 def retrosheet_event_zip(
-    year: int, out_dir: Path, force: bool = False, verbose: bool = False
+    year: int,
+    out_dir: Path,
+    force: bool = False,
+    verbose: bool = False,
+    session: Optional[Session] = None,
 ) -> Optional[Path]:
     """Download a yearly event zip file
     Assumes the output directory exists
+
+    With force, an existing archive is revalidated with a conditional
+    request rather than re-downloaded.
+    """
+    return fetch_event_zip(year, out_dir, force, verbose, session)[0]
+
+
+def fetch_event_zip(
+    year: int,
+    out_dir: Path,
+    force: bool = False,
+    verbose: bool = False,
+    session: Optional[Session] = None,
+) -> Tuple[Optional[Path], Fetched]:
+    """`retrosheet_event_zip`, also saying whether the archive changed
+
+    An archive that's kept without asking (no force) is NOT_MODIFIED.
     """
     url = Retrosheet.event_url(year)
     out_file = os.path.join(out_dir, '{0}eve.zip'.format(year))
     if os.path.isfile(out_file) and os.path.getsize(out_file) and not force:
         if verbose:
             print('{0} already exists, skipping'.format(out_file))
-        return out_file
-
-    print(url)
-    res = requests.get(url, stream=True)
-    if res.status_code != requests.codes.ok:
-        if verbose:
-            print('Failed on {0} with code {1}'.format(url, res.status_code))
-        return None
+        return out_file, Fetched.NOT_MODIFIED
 
-    with open(out_file, 'wb') as f:
-        for chunk in res.iter_content():
-            f.write(chunk)
-
-    return out_file
+    if verbose:
+        print(url)
+    fetched = fetch_resumable(url, out_file, session, verbose=verbose)
+    return (out_file if fetched else None), fetched
 
 
 def retrosheet_unzip(
@@ -53,40 +210,85 @@ def retrosheet_unzip(
     return out_path
 
 
+def retrosheet_download(
+    years: Iterable[int],
+    zip_dir: Path,
+    data_dir: Optional[Path] = None,
+    workers: int = 8,
+    force: bool = False,
+    verbose: bool = False,
+    session: Optional[Session] = None,
+) -> List[Path]:
+    """Download (and extract) several seasons concurrently
+
+    Archives are fetched by a bounded thread pool sharing one pooled
+    session. If data_dir is given, each archive is handed to a separate
+    extraction thread as soon as it arrives, so unzipping one season
+    overlaps downloading the next. Returns the extracted directories (or
+    the archives) in year order. With force, only the archives that were
+    downloaded again are re-extracted; one the server says is unchanged
+    is only extracted if its directory is missing.
+    """
+    if session is None:
+        session = make_session(workers)
+    done: Dict[int, Path] = dict()
+    with ThreadPoolExecutor(workers) as pool, ThreadPoolExecutor(1) as ex:
+        fetches = {
+            pool.submit(
+                fetch_event_zip, year, zip_dir, force, verbose, session
+            ): year
+            for year in years
+        }
+        extracts: Dict[int, Future] = dict()
+        for fut in as_completed(fetches):
+            year, (path, fetched) = fetches[fut], fut.result()
+            if path is None:
+                continue
+            if verbose:
+                print('{0} ({1:,})'.format(path, os.path.getsize(path)))
+            if data_dir is None:
+                done[year] = path
+            else:
+                redo = force and fetched is Fetched.DOWNLOADED
+                extracts[year] = ex.submit(
+                    retrosheet_unzip, path, data_dir, redo, verbose
+                )
+
+        for year, job in extracts.items():
+            out = job.result()
+            if out is not None:
+                if verbose:
+                    print('{0} ({1} files)'.format(out, len(os.listdir(out))))
+                done[year] = out
+    return [done[year] for year in sorted(done)]
+
+
 def retrosheet_seasons(
     retro_dir: Text,
     zip_dir: Text,
     data_dir: Text,
     force: bool = False,
     verbose: bool = False,
+    unzip: bool = True,
+    workers: int = 8,
 ) -> List[Path]:
-    # retro_dir = os.path.join('f:\\local_scratch', 'retrosheet')
-    if not os.path.isdir(retro_dir):
-        os.makedirs(retro_dir)
-
-    # zip_dir = os.path.join(retro_dir, 'events', 'raw')
-    if not os.path.isdir(zip_dir):
-        os.makedirs(zip_dir)
-
-    eve_zips = []
-    for year in Retrosheet.years:
-        p = retrosheet_event_zip(year, zip_dir)
-        if p is not None:
-            if verbose:
-                print('{0} ({1:,})'.format(p, os.path.getsize(p)))
-            eve_zips.append(p)
-
-    # data_dir = os.path.join(retro_dir, 'events', 'data')
-    if not os.path.isdir(data_dir):
-        os.makedirs(data_dir)
-    eve_dirs = []
-    for file in eve_zips:
-        o = retrosheet_unzip(file, data_dir)
-        if o is not None:
-            if verbose:
-                print('{0} ({1} files)'.format(o, len(os.listdir(o))))
-            eve_dirs.append(o)
-    return eve_dirs
+    """Download (and optionally extract) every season's event archive
+
+    Returns the extracted season directories, or the archives themselves
+    when unzip is False.
+    """
+    for folder in (retro_dir, zip_dir, data_dir):
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+    return retrosheet_download(
+        Retrosheet.years,
+        zip_dir,
+        data_dir if unzip else None,
+        workers=workers,
+        force=force,
+        verbose=verbose,
+    )
 
 
 if __name__ == '__main__':
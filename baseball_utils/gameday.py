@@ -1,12 +1,36 @@
-from datetime import datetime, timedelta
+import time
+from datetime import date, datetime, timedelta
 from functools import lru_cache, partial
-from typing import Any, ByteString, Dict, Text, Tuple, Optional, ClassVar, List
+from typing import (
+    Any,
+    ByteString,
+    ClassVar,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Text,
+    Tuple,
+)
 from urllib.parse import urljoin, urlparse, urlunparse
 
 import attr
 from bs4 import BeautifulSoup, Tag
 from requests import Session
 
+from baseball_utils.cache import CacheBackend, DiskCache, cached_get
+from baseball_utils.column_store import ColumnStore
+from baseball_utils.gameday_pitches import PitchTable, store_pitches
+from baseball_utils.gameday_xml import (
+    NOT_PLAYED,
+    GameRecord,
+    LineRecord,
+    parse_scoreboard,
+)
 from baseball_utils.savant import Savant
 from baseball_utils.util import (
     create_soup,
@@ -14,7 +38,6 @@ from baseball_utils.util import (
     make_abs_url,
     base_url,
     CachedValue,
-    home_away_vals,
 )
 
 
@@ -23,6 +46,111 @@ class GamedayError(Exception):
 
 
 MASTER_TIMEOUT = timedelta(minutes=1)
+# How long after midnight a day's games may still be running
+FINAL_MARGIN = timedelta(days=1)
+GD_BASE = 'http://gd.mlb.com'
+INNING_FILE = 'inning/inning_all.xml'
+
+
+def final_after(dt: date) -> float:
+    """time.time() after which responses for a date can't change
+
+    That's the midnight ending the date plus FINAL_MARGIN, since late games
+    may still be running just after midnight. Responses cached before then
+    are only kept for MASTER_TIMEOUT; ones cached after it, for good.
+    """
+    end = datetime.combine(dt + timedelta(days=1), datetime.min.time())
+    return (end + FINAL_MARGIN).timestamp()
+
+
+def day_url(dt: date, gd_base: Text = GD_BASE) -> Text:
+    """URL of the Gameday directory listing for a date"""
+    url = '/'.join(
+        (
+            gd_base,
+            'components',
+            'game',
+            'mlb',
+            'year_{0:%Y}',
+            'month_{0:%m}',
+            'day_{0:%d}',
+        )
+    )
+    return url.format(dt)
+
+
+def master_url(gameday_url: Text, listing: ByteString) -> Text:
+    """Find the master scoreboard in a day's directory listing"""
+    soup = create_soup(listing)
+    master_href: Optional[Text] = None
+    for a in soup('a', href=True):
+        if 'master_scoreboard.xml' in a['href']:
+            master_href = a['href']
+            break
+
+    if master_href is None:
+        raise GamedayError(
+            'unable to find master scoreboard ({0})'.format(gameday_url)
+        )
+
+    return make_abs_url(base_url(gameday_url), master_href)
+
+
+CHANGE_FIELDS = ('status', 'inning', 'r', 'h', 'e')
+
+
+def game_state(game: GameRecord) -> Dict[Text, Any]:
+    """The parts of a game that we watch for changes"""
+    line = game.linescore
+    return {
+        'status': game.status.ind,
+        'inning': (game.status.inning, game.status.top_inning),
+        'r': line.runs if line is not None else None,
+        'h': line.hits if line is not None else None,
+        'e': line.errors if line is not None else None,
+    }
+
+
+@default_attrs()
+class GameChange(object):
+    game: GameRecord = attr.ib()
+    previous: Optional[GameRecord] = attr.ib(default=None, repr=False)
+    changed: FrozenSet[Text] = attr.ib(default=frozenset())
+
+    @property
+    def is_new(self) -> bool:
+        return self.previous is None
+
+
+def diff_games(
+    previous: Mapping[Text, GameRecord], current: Iterable[GameRecord]
+) -> Iterator[GameChange]:
+    """Yield a change for each game whose status, inning or R/H/E moved"""
+    for game in current:
+        prev = previous.get(game.id)
+        if prev is None:
+            yield GameChange(game, None, frozenset(CHANGE_FIELDS))
+            continue
+        old, new = game_state(prev), game_state(game)
+        changed = frozenset(k for k in CHANGE_FIELDS if old[k] != new[k])
+        if changed:
+            yield GameChange(game, prev, changed)
+
+
+@default_attrs()
+class BoxScore(object):
+    """A started game and every pitch thrown in it so far"""
+
+    game: GameRecord = attr.ib()
+    pitches: PitchTable = attr.ib(repr=False)
+
+    @property
+    def game_id(self) -> Text:
+        return self.game.id
+
+    @property
+    def linescore(self) -> Optional['Linescore']:
+        return Linescore.from_game(self.game)
 
 
 @default_attrs()
@@ -32,108 +160,163 @@ class GamedayData(object):
     session: Session = attr.ib()
     savant: Savant = attr.ib()
     dt: datetime = attr.ib(factory=datetime.today)
-    gd_base: ClassVar[Text] = 'http://gd.mlb.com'
-    _master: CachedValue[BeautifulSoup] = attr.ib(
-        default=CachedValue(MASTER_TIMEOUT)
+    gd_base: ClassVar[Text] = GD_BASE
+    streaming: bool = attr.ib(default=True)  # False parses with bs4
+    http_cache: Optional[DiskCache] = attr.ib(factory=DiskCache, repr=False)
+    value_cache: Optional[CacheBackend] = attr.ib(default=None, repr=False)
+    _master: CachedValue[bytes] = attr.ib(
+        default=attr.Factory(
+            lambda self: CachedValue(
+                MASTER_TIMEOUT,
+                backend=self.value_cache,
+                key='gameday:master:{0:%Y-%m-%d}'.format(self.dt),
+            ),
+            takes_self=True,
+        ),
+        repr=False,
     )
+    _last: Dict[Text, GameRecord] = attr.ib(factory=dict, repr=False)
 
     @property
     def gameday_url(self) -> Text:
-        url = '/'.join(
-            (
-                self.gd_base,
-                'components',
-                'game',
-                'mlb',
-                'year_{0:%Y}',
-                'month_{0:%m}',
-                'day_{0:%d}',
-            )
+        return day_url(self.dt, self.gd_base)
+
+    @property
+    def master_content(self) -> bytes:
+        """Raw master scoreboard XML"""
+        return self._master.get_or_load(self.fetch_master)
+
+    def fetch_master(self, fresh: bool = False) -> bytes:
+        """Fetch the master scoreboard, bypassing any cached copy if fresh"""
+        final = final_after(self.dt)
+        listing = cached_get(
+            self.session,
+            self.gameday_url,
+            self.http_cache,
+            MASTER_TIMEOUT,
+            final_after=final,
+        )
+        return cached_get(
+            self.session,
+            master_url(self.gameday_url, listing),
+            self.http_cache,
+            timedelta(0) if fresh else MASTER_TIMEOUT,
+            final_after=None if fresh else final,
         )
-        return url.format(self.dt)
 
     @property
     def master_scoreboard(self) -> BeautifulSoup:
-        if self._master.timed_out:
-            self._master.clear()
-        if not self._master.is_none():
-            return self._master.get()
-
-        res = self.session.get(self.gameday_url)
-        res.raise_for_status()
-
-        soup = create_soup(res.content)
-        master_href: Optional[Text] = None
-        for a in soup('a', href=True):
-            if 'master_scoreboard.xml' in a['href']:
-                master_href = a['href']
-                break
-
-        if master_href is None:
-            raise GamedayError(
-                'unable to find master scoreboard ({0})'.format(
-                    self.gameday_url
-                )
-            )
-
-        base = base_url(self.gameday_url)
-        r = self.session.get(make_abs_url(base, master_href))
-        r.raise_for_status()
+        return create_soup(self.master_content)
 
-        self._master.refresh(create_soup(r.content))
-        return self._master.get()
+    @property
+    def scoreboard(self) -> List[GameRecord]:
+        """Typed records for every game on the master scoreboard"""
+        return parse_scoreboard(self.master_content, self.streaming)
 
     @property
     def games(self):
         """For convinience, we iterate over games a lot"""
         return (game for game in self.master_scoreboard('game'))
 
-    def ip_games(self):
-        """Yields 'game' elements for in-progress games"""
-        for game in self.games:
-            stat = game.find('status', ind=True)
-            if stat is None:
-                continue
-            if stat['ind'] == 'I':
+    def ip_games(self) -> Iterator[GameRecord]:
+        """Yields records for in-progress games"""
+        for game in self.scoreboard:
+            if game.status.in_progress:
                 yield game
 
-    class BoxScore(object):
-        pass
+    def changes(self, fresh: bool = True) -> List['GameChange']:
+        """Games that moved since the previous call (all games the first time)
 
-    def boxscores(self):
-        """Yield a series of BoxScore objects for each in-progress or finished
-        game
+        :param fresh: re-fetch the scoreboard rather than using a cached one
         """
-        for game in self.ip_games():
-            pass
-
-    def linescores(self):
-        for game in self.games:
-            ls = game.find('linescore')
-            if ls is None:
-                continue
-            yield Linescore(ls, game)
-            continue
-            line = Linescore(game['away_team_name'], game['home_team_name'])
-            for inning in ls('inning', away=True, home=True):
-                a_runs, h_runs = 0, 0
-                if inning['away']:
-                    a_runs = int(inning['away'])
-
-                if inning['home']:
-                    h_runs = int(inning['home'])
-
-                line.innings.append({'away': a_runs, 'home': h_runs})
-            h = ls.find('h')
-            if h is None:
-                continue
-            a_hits, h_hits = 0, 0
-            if h['away']:
-                a_hits = int(h['away'])
-            if h['home']:
-                h_hits = int(h['home'])
-            line.hits.update({'away': a_hits, 'home': h_hits})
-            yield line
+        if fresh:
+            self._master.refresh(self.fetch_master(fresh=True))
+        games = self.scoreboard
+        ret = list(diff_games(self._last, games))
+        self._last = {game.id: game for game in games}
+        return ret
+
+    def poll(
+        self,
+        interval: float = MASTER_TIMEOUT.total_seconds(),
+        limit: Optional[int] = None,
+    ) -> Iterator['GameChange']:
+        """Re-fetch the scoreboard every interval seconds, yielding changes
+
+        :param limit: stop after this many fetches (forever if None)
+        """
+        n = 0
+        while limit is None or n < limit:
+            if n:
+                time.sleep(interval)
+            yield from self.changes()
+            n += 1
+
+    def details(self, limit: int = 8) -> List[Any]:
+        """Fetch the scoreboard and every game's detail files concurrently
+
+        See `gameday_async.AsyncGameday`; the fetched scoreboard also
+        refreshes the cached one.
+        """
+        from baseball_utils.gameday_async import AsyncGameday
+
+        client = AsyncGameday(
+            self.dt, limit, gd_base=self.gd_base, http_cache=self.http_cache
+        )
+        content, details = client.refresh()
+        self._master.refresh(content)
+        return details
+
+    def boxscores(
+        self, games: Optional[Iterable[GameRecord]] = None
+    ) -> Iterator[BoxScore]:
+        """Yield a BoxScore for each of some games (by default, every one
+        that's in progress or finished)
+
+        The games' pitch files are all fetched concurrently (see
+        `gameday_async.AsyncGameday.details`); a game that's still going
+        is always re-fetched.
+        """
+        from baseball_utils.gameday_async import AsyncGameday
+
+        if games is None:
+            games = (
+                game
+                for game in self.scoreboard
+                if game.status.in_progress or game.status.is_final
+            )
+        client = AsyncGameday(
+            self.dt,
+            files=(INNING_FILE,),
+            gd_base=self.gd_base,
+            http_cache=self.http_cache,
+        )
+        for details in client.details(list(games)):
+            content = details.files[INNING_FILE]
+            if content is not None:
+                pitches = PitchTable.from_xml(details.game_id, content)
+                yield BoxScore(details.game, pitches)
+
+    def store_pitches(self, store: ColumnStore) -> int:
+        """Append the pitches of every finished game to a pitch store
+
+        Games already in the store are skipped (and not fetched), so this
+        can be re-run. Returns the number of pitches added.
+        """
+        games = [
+            game
+            for game in self.scoreboard
+            if game.status.is_final and not store.has_partition(game.id)
+        ]
+        return store_pitches(
+            store, (box.pitches for box in self.boxscores(games))
+        )
+
+    def linescores(self) -> Iterator['Linescore']:
+        for game in self.scoreboard:
+            ls = Linescore.from_game(game)
+            if ls is not None:
+                yield ls
 
 
 @default_attrs()
@@ -143,40 +326,39 @@ class Game(object):
 
 @default_attrs()
 class Linescore(object):
-    tag: Tag = attr.ib()
-    game: Tag = attr.ib()
+    """A game's linescore, rendered from its parsed LineRecord"""
+
+    away_team: Text = attr.ib()
+    home_team: Text = attr.ib()
+    line: LineRecord = attr.ib(repr=False)
+
+    @classmethod
+    def from_game(cls, game: GameRecord) -> Optional['Linescore']:
+        if game.linescore is None:
+            return None
+        return cls(game.away_team_name, game.home_team_name, game.linescore)
 
-    def _innings(self) -> List[Dict[Text, int]]:
-        ret = list()
-        for inn in self.tag('inning', away=True, home=True):
-            ret.append(home_away_vals(inn))
+    def to_json(self) -> Dict[Text, Any]:
+        ret = self.line.to_json()
+        ret.update({'away_team': self.away_team, 'home_team': self.home_team})
         return ret
 
     def __str__(self) -> Text:
-        away, home = self.game['away_team_name'], self.game['home_team_name']
-        innings = self._innings()
-        hits = home_away_vals(self.tag.find('h'))
-        errors = home_away_vals(self.tag.find('e'))
+        away, home = self.away_team, self.home_team
+        line = self.line
         long_team = max(map(len, (away, home)))
 
-        runs = {
-            'away': sum(e['away'] for e in innings),
-            'home': sum(e['home'] for e in innings),
-        }
-        max_col = max(
-            list(runs.values()) + list(hits.values()) + list(errors.values())
-        )
+        max_col = max(line.totals) if line.totals else 0
         max_width = len(str(max_col))
 
-        num_inn = max(len(innings), 9)
+        num_inn = max(len(line.away), 9)
 
         def _box(i: Any) -> Text:
+            if i == NOT_PLAYED:
+                i = ''
             b = '| ' + '{0:^' + str(max_width) + '} '
             return b.format(i)
 
-        max_box_width = len(_box(max_col))
-        line_width = long_team + (max_box_width * num_inn) + 2
-
         msg = []
 
         head = []
@@ -193,30 +375,22 @@ class Linescore(object):
         line_width = len(msg[-1])
         msg.append('-' * line_width)
 
-        def make_line(t):
-            if t == 'away':
-                team = away
-            else:
-                team = home
-
+        def make_line(team: Text, innings: Sequence[int], side: int) -> Text:
             r = []
             r.append(team)
             r.append(' ' * (long_team - len(team) + 1))
-            for inn in innings:
-                r.append(_box(inn[t]))
-            if len(innings) < 9:
-                diff = 9 - len(innings)
-                for _ in range(diff):
-                    r.append(_box(''))
-            r.append(_box(runs[t]))
-            r.append(_box(hits[t]))
-            r.append(_box(errors[t]))
+            for runs in innings:
+                r.append(_box(runs))
+            for _ in range(num_inn - len(innings)):
+                r.append(_box(''))
+            for name in ('r', 'h', 'e'):
+                r.append(_box(line.total(name)[side]))
             r.append('|')
             return ''.join(r)
 
-        msg.append(make_line('away'))
+        msg.append(make_line(away, line.away, 0))
         msg.append('-' * line_width)
-        msg.append(make_line('home'))
+        msg.append(make_line(home, line.home, 1))
 
         return '\n'.join(msg)
 
@@ -0,0 +1,164 @@
+"""Asyncio Gameday client for scoreboards and per-game detail files"""
+import asyncio
+from datetime import datetime
+from typing import Any, Coroutine, Dict, List, Optional, Text, Tuple, TypeVar
+
+import aiohttp
+import attr
+
+from baseball_utils.cache import DiskCache
+from baseball_utils.gameday import (
+    GD_BASE,
+    INNING_FILE,
+    MASTER_TIMEOUT,
+    day_url,
+    final_after,
+    master_url,
+)
+from baseball_utils.gameday_xml import GameRecord, iter_scoreboard
+from baseball_utils.util import default_attrs
+
+DETAIL_FILES = ('linescore.xml', 'boxscore.xml', INNING_FILE)
+TIMEOUT = 30.0
+
+T = TypeVar('T')
+
+
+@default_attrs()
+class GameDetails(object):
+    game: GameRecord = attr.ib(repr=False)
+    data_url: Text = attr.ib()
+    files: Dict[Text, Optional[bytes]] = attr.ib(factory=dict, repr=False)
+
+    @property
+    def game_id(self) -> Text:
+        return self.game.id
+
+
+@default_attrs()
+class AsyncGameday(object):
+    """Fetches a day's master scoreboard, then every game's files concurrently
+
+    All requests go through one aiohttp session whose connector holds at
+    most `limit` keep-alive connections, so a whole refresh costs roughly
+    one round trip per level (listing, scoreboard, details).
+    """
+
+    dt: datetime = attr.ib(factory=datetime.today)
+    limit: int = attr.ib(default=8)
+    files: Tuple[Text, ...] = attr.ib(default=DETAIL_FILES)
+    gd_base: Text = attr.ib(default=GD_BASE)
+    http_cache: Optional[DiskCache] = attr.ib(default=None, repr=False)
+
+    @property
+    def gameday_url(self) -> Text:
+        return day_url(self.dt, self.gd_base)
+
+    def make_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit, limit_per_host=self.limit
+        )
+        timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def fetch(
+        self,
+        session: aiohttp.ClientSession,
+        url: Text,
+        required: bool = True,
+        fresh: bool = False,
+    ) -> Optional[bytes]:
+        """
+        :param fresh: go to the network even if the response is cached
+        """
+        if self.http_cache is not None and not fresh:
+            content = self.http_cache.get(
+                url, MASTER_TIMEOUT, final_after(self.dt)
+            )
+            if content is not None:
+                return content
+
+        async with session.get(url) as res:
+            if not required and res.status == 404:
+                return None
+            res.raise_for_status()
+            content = await res.read()
+        if self.http_cache is not None:
+            self.http_cache.put(url, content)
+        return content
+
+    async def master_content(self, session: aiohttp.ClientSession) -> bytes:
+        listing = await self.fetch(session, self.gameday_url)
+        assert listing is not None
+        content = await self.fetch(
+            session, master_url(self.gameday_url, listing)
+        )
+        assert content is not None
+        return content
+
+    async def game_details(
+        self,
+        session: aiohttp.ClientSession,
+        game: GameRecord,
+        fresh: bool = False,
+    ) -> GameDetails:
+        """Every detail file for one game (None for files that don't exist)"""
+        data_url = self.gd_base + game.game_data_directory
+        urls = [data_url + '/' + name for name in self.files]
+        bodies = await asyncio.gather(
+            *(
+                self.fetch(session, url, required=False, fresh=fresh)
+                for url in urls
+            )
+        )
+        return GameDetails(game, data_url, dict(zip(self.files, bodies)))
+
+    async def refresh_async(self) -> Tuple[bytes, List[GameDetails]]:
+        """The raw master scoreboard and the details of each of its games"""
+        async with self.make_session() as session:
+            content = await self.master_content(session)
+            games = [
+                game
+                for game in iter_scoreboard(content)
+                if game.game_data_directory
+            ]
+            details = await asyncio.gather(
+                *(self.game_details(session, game) for game in games)
+            )
+        return content, list(details)
+
+    async def details_async(
+        self, games: List[GameRecord]
+    ) -> List[GameDetails]:
+        """The details of some games, in order
+
+        Files of games that aren't over yet are always fetched again.
+        """
+        async with self.make_session() as session:
+            details = await asyncio.gather(
+                *(
+                    self.game_details(
+                        session, game, fresh=not game.status.is_final
+                    )
+                    for game in games
+                    if game.game_data_directory
+                )
+            )
+        return list(details)
+
+    def refresh(self) -> Tuple[bytes, List[GameDetails]]:
+        """Blocking wrapper around `refresh_async`"""
+        return run(self.refresh_async())
+
+    def details(self, games: List[GameRecord]) -> List[GameDetails]:
+        """Blocking wrapper around `details_async`"""
+        return run(self.details_async(games))
+
+
+def run(coro: Coroutine[Any, Any, T]) -> T:
+    """Run a coroutine to completion on a new event loop"""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
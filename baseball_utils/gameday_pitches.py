@@ -0,0 +1,219 @@
+"""Pitch-by-pitch data from Gameday inning XML, as NumPy columns
+
+`PitchTable.from_xml` streams a game's `inning/inning_all.xml` and keeps
+one row per pitch; `pitch_store` opens the append-only on-disk store that
+tables from many games are appended to (one partition per game).
+"""
+import io
+from array import array
+from datetime import date
+from typing import Dict, Iterable, List, Text, Type
+
+import attr
+import numpy as np
+from lxml import etree  # type: ignore
+
+from baseball_utils.column_store import ColumnStore
+from baseball_utils.gameday_xml import XMLSource
+from baseball_utils.play_table import Encoder
+from baseball_utils.types import ColumnSchema, Path
+from baseball_utils.util import default_attrs, parse_float, parse_int
+
+NO_ZONE = -1  # zone of a pitch without tracking data
+
+# Per-pitch columns of a PitchTable, in order
+PITCH_COLUMNS: ColumnSchema = {
+    'inning': 'u1',
+    'top': '?',
+    'atbat': 'i2',  # at-bat number within the game
+    'batter': 'i4',  # MLBAM player ids (the keys of Savant.ids)
+    'pitcher': 'i4',
+    'balls': 'i1',  # count before the pitch
+    'strikes': 'i1',
+    'outs': 'i1',
+    'pitch_type': 'i2',  # codes into PitchTable.pitch_types
+    'result': 'i2',  # codes into PitchTable.results ('B', 'S' or 'X')
+    'des': 'i2',  # codes into PitchTable.descriptions
+    'event': 'i2',  # codes into PitchTable.events (the at-bat's result)
+    'start_speed': 'f4',  # NaN without tracking data
+    'end_speed': 'f4',
+    'px': 'f4',
+    'pz': 'f4',
+    'zone': 'i1',
+    'spin_rate': 'f4',
+}
+PITCH_STRINGS = ('pitch_type', 'result', 'des', 'event')
+
+# Columns added by the store to tell games apart
+STORE_COLUMNS: ColumnSchema = dict(
+    PITCH_COLUMNS, game='i4', game_date='M8[D]'
+)
+STORE_STRINGS = PITCH_STRINGS + ('game',)
+
+
+def game_date(game_id: Text) -> date:
+    """Date of a Gameday game id ('2018/06/22/nyamlb-tbamlb-1') or data
+    directory name ('gid_2018_06_22_nyamlb_tbamlb_1')
+    """
+    if game_id.startswith('gid_'):
+        game_id = game_id[4:]
+    year, month, day = game_id.replace('/', '_').split('_')[:3]
+    return date(int(year), int(month), int(day))
+
+
+@default_attrs()
+class PitchTable(object):
+    """Every pitch of one game, one NumPy array per PITCH_COLUMNS entry"""
+
+    game_id: Text = attr.ib()
+    inning: np.ndarray = attr.ib()
+    top: np.ndarray = attr.ib()
+    atbat: np.ndarray = attr.ib()
+    batter: np.ndarray = attr.ib()
+    pitcher: np.ndarray = attr.ib()
+    balls: np.ndarray = attr.ib()
+    strikes: np.ndarray = attr.ib()
+    outs: np.ndarray = attr.ib()
+    pitch_type: np.ndarray = attr.ib()
+    result: np.ndarray = attr.ib()
+    des: np.ndarray = attr.ib()
+    event: np.ndarray = attr.ib()
+    start_speed: np.ndarray = attr.ib()
+    end_speed: np.ndarray = attr.ib()
+    px: np.ndarray = attr.ib()
+    pz: np.ndarray = attr.ib()
+    zone: np.ndarray = attr.ib()
+    spin_rate: np.ndarray = attr.ib()
+    pitch_types: List[Text] = attr.ib(factory=list, repr=False)
+    results: List[Text] = attr.ib(factory=list, repr=False)
+    descriptions: List[Text] = attr.ib(factory=list, repr=False)
+    events: List[Text] = attr.ib(factory=list, repr=False)
+
+    @classmethod
+    def from_xml(
+        cls: Type['PitchTable'], game_id: Text, source: XMLSource
+    ) -> 'PitchTable':
+        """Build a table from a game's inning_all.xml
+
+        The count before each pitch is worked out from the pitch results,
+        since the feed only gives the count at the end of each at-bat.
+        """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+
+        enc: Dict[Text, Encoder] = {name: Encoder() for name in PITCH_STRINGS}
+        cols: Dict[Text, array] = {
+            name: array(np.dtype(dtype).char if dtype != '?' else 'b')
+            for name, dtype in PITCH_COLUMNS.items()
+        }
+        inning, top = 0, True
+        ab: Dict[Text, Text] = dict()
+        balls = strikes = 0
+
+        for event, elem in etree.iterparse(source, events=('start', 'end')):
+            tag = elem.tag
+            if event == 'start':
+                if tag == 'inning':
+                    inning = parse_int(elem.get('num'))
+                elif tag in ('top', 'bottom'):
+                    top = tag == 'top'
+                elif tag == 'atbat':
+                    ab = dict(elem.attrib)
+                    balls = strikes = 0
+                continue
+
+            if tag == 'pitch':
+                a = elem.attrib
+                result = a.get('type', '')
+                cols['inning'].append(inning)
+                cols['top'].append(top)
+                cols['atbat'].append(parse_int(ab.get('num')))
+                cols['batter'].append(parse_int(ab.get('batter')))
+                cols['pitcher'].append(parse_int(ab.get('pitcher')))
+                cols['balls'].append(balls)
+                cols['strikes'].append(strikes)
+                cols['outs'].append(parse_int(ab.get('o')))
+                cols['pitch_type'].append(
+                    enc['pitch_type'](a.get('pitch_type', ''))
+                )
+                cols['result'].append(enc['result'](result))
+                cols['des'].append(enc['des'](a.get('des', '')))
+                cols['event'].append(enc['event'](ab.get('event', '')))
+                for name in ('start_speed', 'end_speed', 'px', 'pz'):
+                    cols[name].append(parse_float(a.get(name)))
+                cols['zone'].append(parse_int(a.get('zone'), NO_ZONE))
+                cols['spin_rate'].append(parse_float(a.get('spin_rate')))
+
+                if result == 'B':
+                    balls = min(balls + 1, 3)
+                elif result == 'S' and (
+                    strikes < 2 or 'Foul' not in a.get('des', '')
+                ):
+                    strikes = min(strikes + 1, 2)
+            elif tag == 'atbat':
+                elem.clear()
+
+        arrays = {
+            name: np.frombuffer(cols[name], dtype=dtype)
+            if dtype != '?'
+            else np.frombuffer(cols[name], dtype=np.int8).astype(bool)
+            for name, dtype in PITCH_COLUMNS.items()
+        }
+        return cls(
+            game_id,
+            pitch_types=enc['pitch_type'].values,
+            results=enc['result'].values,
+            descriptions=enc['des'].values,
+            events=enc['event'].values,
+            **arrays,
+        )
+
+    def __len__(self) -> int:
+        return len(self.inning)
+
+    @property
+    def game_date(self) -> date:
+        return game_date(self.game_id)
+
+    @property
+    def columns(self) -> Dict[Text, np.ndarray]:
+        return {name: getattr(self, name) for name in PITCH_COLUMNS}
+
+    @property
+    def strings(self) -> Dict[Text, List[Text]]:
+        return {
+            'pitch_type': self.pitch_types,
+            'result': self.results,
+            'des': self.descriptions,
+            'event': self.events,
+        }
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self.columns.values())
+
+    def pitch_type_counts(self) -> Dict[Text, int]:
+        counts = np.bincount(self.pitch_type, minlength=len(self.pitch_types))
+        return dict(zip(self.pitch_types, counts.tolist()))
+
+    def append_to(self, store: ColumnStore) -> int:
+        """Add this game to a pitch store (a no-op if it's already there)"""
+        if store.has_partition(self.game_id):
+            return 0
+        columns = self.columns
+        columns['game'] = np.zeros(len(self), dtype=np.int32)
+        columns['game_date'] = np.full(
+            len(self), np.datetime64(self.game_date, 'D')
+        )
+        strings = dict(self.strings, game=[self.game_id])
+        return store.append(self.game_id, columns, strings)
+
+
+def pitch_store(root: Path) -> ColumnStore:
+    """The on-disk store that PitchTables are appended to"""
+    return ColumnStore(root, STORE_COLUMNS, STORE_STRINGS)
+
+
+def store_pitches(store: ColumnStore, tables: Iterable[PitchTable]) -> int:
+    """Append every game not stored yet; returns the number of new pitches"""
+    return sum(table.append_to(store) for table in tables)
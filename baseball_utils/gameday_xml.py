@@ -0,0 +1,227 @@
+"""Typed records parsed from Gameday scoreboard XML
+
+The default path streams the document through lxml's iterparse, keeping
+only the attributes we use and freeing each <game> element as soon as it
+has been read. `parse_scoreboard(..., streaming=False)` builds the same
+records from a BeautifulSoup tree instead.
+"""
+import io
+from array import array
+from typing import (
+    Any,
+    BinaryIO,
+    ByteString,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Text,
+    Tuple,
+    Type,
+    Union,
+    cast,
+)
+
+import attr
+from bs4 import Tag
+from lxml import etree  # type: ignore
+
+from baseball_utils.util import create_soup, default_attrs, parse_int
+
+XMLSource = Union[ByteString, BinaryIO]
+RHE = ('r', 'h', 'e')
+
+
+@default_attrs()
+class Status(object):
+    status: Text = attr.ib(default='')
+    ind: Text = attr.ib(default='')
+    inning: int = attr.ib(default=0)
+    top_inning: bool = attr.ib(default=True)
+    outs: int = attr.ib(default=0)
+    balls: int = attr.ib(default=0)
+    strikes: int = attr.ib(default=0)
+
+    @property
+    def in_progress(self) -> bool:
+        return self.ind == 'I'
+
+    @property
+    def is_final(self) -> bool:
+        # F(inal), O (game over) and their variants (FR, FT, ...)
+        return self.ind[:1] in ('F', 'O')
+
+    @classmethod
+    def from_attrs(cls: Type['Status'], a: Mapping[Text, Text]) -> 'Status':
+        return cls(
+            a.get('status', ''),
+            a.get('ind', ''),
+            parse_int(a.get('inning')),
+            a.get('top_inning', 'Y') == 'Y',
+            parse_int(a.get('o')),
+            parse_int(a.get('b')),
+            parse_int(a.get('s')),
+        )
+
+
+NOT_PLAYED = -1  # Runs for a half inning that hasn't been played
+
+
+def _attrs(tag: Tag) -> Mapping[Text, Text]:
+    # None of the attributes we read are multi-valued (like 'class')
+    return cast(Mapping[Text, Text], tag.attrs)
+
+
+def _runs(value: Optional[Text]) -> int:
+    if not value or not value.isdigit():
+        return NOT_PLAYED
+    return int(value)
+
+
+@default_attrs()
+class LineRecord(object):
+    """Per-inning runs plus R/H/E for both sides, in compact arrays
+
+    `away`/`home` hold one entry per inning (NOT_PLAYED for a half that
+    hasn't happened); `totals` holds away R, H, E then home R, H, E.
+    """
+
+    away: array = attr.ib(factory=lambda: array('h'))
+    home: array = attr.ib(factory=lambda: array('h'))
+    totals: array = attr.ib(factory=lambda: array('h', [0] * 6))
+
+    def add_inning(self, away: Optional[Text], home: Optional[Text]) -> None:
+        self.away.append(_runs(away))
+        self.home.append(_runs(home))
+
+    def set_total(
+        self, name: Text, away: Optional[Text], home: Optional[Text]
+    ) -> None:
+        i = RHE.index(name)
+        self.totals[i] = parse_int(away)
+        self.totals[i + 3] = parse_int(home)
+
+    def total(self, name: Text) -> Tuple[int, int]:
+        """(away, home) value of 'r', 'h' or 'e'"""
+        i = RHE.index(name)
+        return self.totals[i], self.totals[i + 3]
+
+    @property
+    def innings(self) -> List[Tuple[int, int]]:
+        return list(zip(self.away, self.home))
+
+    @property
+    def runs(self) -> Tuple[int, int]:
+        return self.total('r')
+
+    @property
+    def hits(self) -> Tuple[int, int]:
+        return self.total('h')
+
+    @property
+    def errors(self) -> Tuple[int, int]:
+        return self.total('e')
+
+    def to_json(self) -> Dict[Text, Any]:
+        return {
+            'innings': {
+                'away': [r if r != NOT_PLAYED else None for r in self.away],
+                'home': [r if r != NOT_PLAYED else None for r in self.home],
+            },
+            'r': list(self.runs),
+            'h': list(self.hits),
+            'e': list(self.errors),
+        }
+
+    @classmethod
+    def from_tag(cls: Type['LineRecord'], tag: Tag) -> 'LineRecord':
+        ret = cls()
+        for inn in tag('inning', away=True, home=True):
+            a = _attrs(inn)
+            ret.add_inning(a.get('away'), a.get('home'))
+        for name in RHE:
+            elem = tag.find(name)
+            if elem is not None:
+                a = _attrs(elem)
+                ret.set_total(name, a.get('away'), a.get('home'))
+        return ret
+
+
+@default_attrs()
+class GameRecord(object):
+    id: Text = attr.ib()
+    away_team_name: Text = attr.ib(default='')
+    home_team_name: Text = attr.ib(default='')
+    game_data_directory: Text = attr.ib(default='', repr=False)
+    status: Status = attr.ib(factory=Status)
+    linescore: Optional[LineRecord] = attr.ib(default=None, repr=False)
+
+    @classmethod
+    def from_attrs(
+        cls: Type['GameRecord'], a: Mapping[Text, Text]
+    ) -> 'GameRecord':
+        return cls(
+            a.get('id', ''),
+            a.get('away_team_name', ''),
+            a.get('home_team_name', ''),
+            a.get('game_data_directory', ''),
+        )
+
+    @classmethod
+    def from_tag(cls: Type['GameRecord'], tag: Tag) -> 'GameRecord':
+        ret = cls.from_attrs(_attrs(tag))
+        stat = tag.find('status', recursive=False)
+        if stat is not None:
+            ret.status = Status.from_attrs(_attrs(stat))
+        ls = tag.find('linescore', recursive=False)
+        if ls is not None:
+            ret.linescore = LineRecord.from_tag(ls)
+        return ret
+
+
+def iter_scoreboard(source: XMLSource) -> Iterator[GameRecord]:
+    """Stream GameRecords out of a master scoreboard document"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    game: Optional[GameRecord] = None
+    line: Optional[LineRecord] = None
+    for event, elem in etree.iterparse(source, events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            if tag == 'game':
+                game = GameRecord.from_attrs(elem.attrib)
+            elif tag == 'linescore' and game is not None:
+                line = game.linescore = LineRecord()
+            continue
+
+        if game is None:
+            continue
+        if line is not None:
+            a = elem.attrib
+            if tag == 'inning':
+                if 'away' in a and 'home' in a:
+                    line.add_inning(a['away'], a['home'])
+            elif tag in RHE:
+                line.set_total(tag, a.get('away'), a.get('home'))
+            elif tag == 'linescore':
+                line = None
+        elif tag == 'status' and elem.getparent().tag == 'game':
+            game.status = Status.from_attrs(elem.attrib)
+        elif tag == 'game':
+            yield game
+            game = None
+            # Free the finished game and anything before it
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+
+def parse_scoreboard(
+    content: ByteString, streaming: bool = True
+) -> List[GameRecord]:
+    if streaming:
+        return list(iter_scoreboard(content))
+    soup = create_soup(content)
+    return [GameRecord.from_tag(tag) for tag in soup('game')]
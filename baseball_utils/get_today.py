@@ -4,8 +4,9 @@ import attr
 from requests import Session
 
 from baseball_utils.gameday import GamedayData
+from baseball_utils.http_client import SESSION
 from baseball_utils.savant import Savant
-from baseball_utils.util import SESSION, default_attrs
+from baseball_utils.util import default_attrs
 
 
 def get_today():
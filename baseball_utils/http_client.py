@@ -0,0 +1,228 @@
+"""One pooled, rate-limited HTTP client for every scraper
+
+`HttpClient` is a `requests.Session`, so it can be passed anywhere a
+session is expected. On top of the plain session it:
+
+- mounts an adapter per host, sized by `pool_sizes`, so threads don't
+  queue for (or throw away) keep-alive connections;
+- limits each host to a request rate with a token bucket;
+- fills in a default (connect, read) timeout;
+- retries connection errors, 429 and 5xx responses to idempotent
+  requests with exponential backoff, honouring Retry-After (pass
+  retry=True to retry anything else, retry=False to never retry);
+- times every request, per host.
+
+Streamed requests (stream=True) are not retried, since the caller is the
+one reading (and possibly resuming) the body.
+
+`SESSION` is the client shared by the whole package.
+"""
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional, Text, Tuple, Union
+from urllib.parse import urlparse
+
+import attr
+import requests
+from requests.adapters import HTTPAdapter
+
+Timeout = Union[float, Tuple[float, float]]
+
+RETRY_STATUS = frozenset((429, 500, 502, 503, 504))
+# Methods that are safe to send twice; others are only retried on request
+IDEMPOTENT = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE'))
+TIMEOUT: Timeout = (5.0, 30.0)  # (connect, read) seconds
+POOL_SIZE = 10
+MAX_RETRY_AFTER = 60.0
+
+# Requests per second allowed to each host (others are unlimited)
+HOST_RATES: Dict[Text, float] = {
+    'baseballsavant.mlb.com': 4.0,
+    'gd.mlb.com': 20.0,
+    'www.fangraphs.com': 1.0,
+    'www.retrosheet.org': 4.0,
+}
+
+
+@attr.s(slots=True, auto_attribs=True)
+class TokenBucket(object):
+    """Blocking token bucket allowing `rate` acquisitions per second
+
+    Up to `burst` tokens accumulate while idle. Waits are reserved under the
+    lock and slept outside it, so concurrent callers queue up fairly.
+    """
+
+    rate: float = attr.ib()
+    burst: float = attr.ib(default=1.0)
+    tokens: float = attr.ib(init=False)
+    last: float = attr.ib(init=False, factory=time.monotonic)
+    _lock: threading.Lock = attr.ib(
+        init=False, factory=threading.Lock, repr=False
+    )
+
+    def __attrs_post_init__(self) -> None:
+        self.tokens = self.burst
+
+    def acquire(self, n: float = 1.0) -> float:
+        """Take n tokens, sleeping until they're available; returns the wait"""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self.last
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.last = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+@attr.s(slots=True, auto_attribs=True)
+class HostStats(object):
+    requests: int = attr.ib(default=0)
+    retries: int = attr.ib(default=0)
+    errors: int = attr.ib(default=0)  # gave up with an exception
+    total: float = attr.ib(default=0.0)  # seconds, including waits
+    waited: float = attr.ib(default=0.0)  # seconds spent rate limited
+    slowest: float = attr.ib(default=0.0)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.requests if self.requests else 0.0
+
+
+def retry_after(res: requests.Response) -> Optional[float]:
+    """Seconds asked for by a Retry-After header (the numeric form only)"""
+    value = res.headers.get('Retry-After', '')
+    try:
+        return min(float(value), MAX_RETRY_AFTER)
+    except ValueError:
+        return None
+
+
+class HttpClient(requests.Session):
+    """A session with per-host pools and rate limits, retries and timing"""
+
+    def __init__(
+        self,
+        pool_size: int = POOL_SIZE,
+        pool_sizes: Optional[Mapping[Text, int]] = None,
+        rates: Optional[Mapping[Text, float]] = None,
+        default_rate: Optional[float] = None,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: Timeout = TIMEOUT,
+    ) -> None:
+        """
+        :param pool_size: connections kept per host without an entry in
+            pool_sizes
+        :param rates: requests per second for each host (HOST_RATES if
+            None); hosts not in it get default_rate (None is no limit)
+        """
+        super().__init__()
+        self.pool_size = pool_size
+        self.pool_sizes: Dict[Text, int] = dict(pool_sizes or {})
+        self.rates: Dict[Text, float] = dict(
+            HOST_RATES if rates is None else rates
+        )
+        self.default_rate = default_rate
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.stats: Dict[Text, HostStats] = dict()
+        self._buckets: Dict[Text, Optional[TokenBucket]] = dict()
+        self._lock = threading.Lock()
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def _host(self, url: Text) -> Text:
+        """Register a host (its adapter, bucket and stats) on first use"""
+        parsed = urlparse(url)
+        host = parsed.netloc
+        with self._lock:
+            if host not in self.stats:
+                size = self.pool_sizes.get(host)
+                if size is not None:
+                    adapter = HTTPAdapter(
+                        pool_connections=1, pool_maxsize=size
+                    )
+                    prefix = '{0}://{1}/'.format(parsed.scheme, host)
+                    self.mount(prefix, adapter)
+                rate = self.rates.get(host, self.default_rate)
+                self._buckets[host] = (
+                    TokenBucket(rate, max(rate, 1.0)) if rate else None
+                )
+                self.stats[host] = HostStats()
+        return host
+
+    def request(  # type: ignore
+        self, method: Text, url: Text, *args: Any, **kwargs: Any
+    ) -> requests.Response:
+        host = self._host(url)
+        bucket = self._buckets[host]
+        stats = self.stats[host]
+        kwargs.setdefault('timeout', self.timeout)
+        retry = kwargs.pop('retry', None)
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT
+        retries = self.retries if retry and not kwargs.get('stream') else 0
+
+        start = time.monotonic()
+        waited = 0.0
+        attempt = 0
+        try:
+            while True:
+                if bucket is not None:
+                    waited += bucket.acquire()
+                try:
+                    res = super().request(method, url, *args, **kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt >= retries:
+                        with self._lock:
+                            stats.errors += 1
+                        raise
+                    delay = None
+                else:
+                    if res.status_code not in RETRY_STATUS:
+                        return res
+                    if attempt >= retries:
+                        return res
+                    delay = retry_after(res)
+                    res.close()
+                if delay is None:
+                    delay = self.backoff * 2 ** attempt
+                time.sleep(delay)
+                attempt += 1
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                stats.requests += 1
+                stats.retries += attempt
+                stats.total += elapsed
+                stats.waited += waited
+                stats.slowest = max(stats.slowest, elapsed)
+
+    def report(self) -> Text:
+        """One line of timing per host"""
+        lines = []
+        for host, s in sorted(self.stats.items()):
+            lines.append(
+                '{0}: {1} requests, {2} retries, {3} errors, '
+                'mean {4:.3f}s, slowest {5:.3f}s, waited {6:.3f}s'.format(
+                    host,
+                    s.requests,
+                    s.retries,
+                    s.errors,
+                    s.mean,
+                    s.slowest,
+                    s.waited,
+                )
+            )
+        return '\n'.join(lines)
+
+
+SESSION = HttpClient()
@@ -1,9 +1,42 @@
-from flask import render_template
+import threading
+from datetime import date
+from typing import Dict
 
+from flask import jsonify, render_template
+
+from baseball_utils.cache import SQLiteCache
+from baseball_utils.gameday import GamedayData
+from baseball_utils.http_client import SESSION
 from baseball_utils.main import bp
+from baseball_utils.savant import Savant
+
+# Shared by every request so that their caches are too; VALUES is also
+# shared with the other worker processes on this host
+VALUES = SQLiteCache()
+SAVANT = Savant(SESSION, value_cache=VALUES)
+_gameday: Dict[date, GamedayData] = dict()
+_gameday_lock = threading.Lock()
+
+
+def gameday() -> GamedayData:
+    """Today's GamedayData, shared between requests"""
+    today = date.today()
+    with _gameday_lock:
+        if today not in _gameday:
+            _gameday.clear()
+            _gameday[today] = GamedayData(
+                SESSION, SAVANT, value_cache=VALUES
+            )
+        return _gameday[today]
 
 
 @bp.route('/', methods=['GET', 'POST'])
 @bp.route('/index', methods=['GET', 'POST'])
 def index():
     return render_template('index.html')
+
+
+@bp.route('/linescores', methods=['GET'])
+def linescores():
+    gd = gameday()
+    return jsonify([ls.to_json() for ls in gd.linescores()])
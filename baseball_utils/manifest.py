@@ -0,0 +1,91 @@
+"""Fingerprints of downloaded/extracted files, used to find what changed"""
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, Optional, Text, Type
+from zipfile import ZipInfo
+
+import attr
+
+from baseball_utils.types import EventSource, Path
+from baseball_utils.util import default_attrs
+
+HASH_CHUNK = 1 << 20
+
+
+@default_attrs()
+class Fingerprint(object):
+    size: int = attr.ib()
+    mtime_ns: int = attr.ib()
+    digest: Text = attr.ib()
+
+
+def file_digest(path: Path) -> Text:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_fingerprint(
+    path: Path, prev: Optional[Fingerprint] = None
+) -> Fingerprint:
+    """Fingerprint a file, only re-hashing it if its size or mtime moved"""
+    st = os.stat(path)
+    if prev is not None:
+        if prev.size == st.st_size and prev.mtime_ns == st.st_mtime_ns:
+            return prev
+    return Fingerprint(st.st_size, st.st_mtime_ns, file_digest(path))
+
+
+def member_fingerprint(info: ZipInfo) -> Fingerprint:
+    """Fingerprint a zip member from its header, without decompressing it"""
+    mtime = datetime(*info.date_time).timestamp()
+    digest = '{0:08x}'.format(info.CRC)
+    return Fingerprint(info.file_size, int(mtime * 1e9), digest)
+
+
+def source_key(source: EventSource) -> Text:
+    """Manifest key for an event file or a member of an event zip"""
+    if isinstance(source, tuple):
+        return '!'.join(source)
+    return source
+
+
+@default_attrs()
+class Manifest(object):
+    """Last known fingerprint of every tracked file, saved as JSON"""
+
+    path: Path = attr.ib()
+    entries: Dict[Text, Fingerprint] = attr.ib(factory=dict, repr=False)
+
+    @classmethod
+    def load(cls: Type['Manifest'], path: Path) -> 'Manifest':
+        if not os.path.isfile(path):
+            return cls(path)
+        with open(path, encoding='utf-8') as f:
+            raw = json.load(f)
+        entries = {k: Fingerprint(**v) for k, v in raw.items()}
+        return cls(path, entries)
+
+    def save(self) -> None:
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            raw = {k: attr.asdict(v) for k, v in self.entries.items()}
+            json.dump(raw, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def get(self, key: Text) -> Optional[Fingerprint]:
+        return self.entries.get(key)
+
+    def check_file(self, path: Path) -> bool:
+        """Update a file's fingerprint, returning whether it changed"""
+        prev = self.entries.get(path)
+        fp = file_fingerprint(path, prev)
+        self.entries[path] = fp
+        return prev is None or prev.digest != fp.digest
@@ -39,30 +39,31 @@ Team Formula:
     luck: capped at 2.0
 """
 from datetime import datetime
+from typing import Any, Dict, Text
 from urllib.parse import urlencode
 
-from requests_html import HTMLSession, HTMLResponse
+from requests import Response
 from splinter import Browser
 
+from baseball_utils.http_client import SESSION
+from baseball_utils.util import create_soup
+
 FG_BASE = 'https://www.fangraphs.com'
 YEAR = datetime.now().year
 MIN_IP = 20
 
-session = HTMLSession()
-
 
-def csv_payload(res: HTMLResponse):
-    asp = res.html.find('.aspNetHidden')
+def csv_payload(res: Response):
+    soup = create_soup(res.content)
     payload = {}
-    for elem in asp:
-        for inp in elem.find('input'):
-            payload[inp.attrs['name']] = inp.attrs['value']
+    for inp in soup.select('.aspNetHidden input'):
+        payload[inp['name']] = inp.get('value', '')
     return payload
 
 
 def pitchers(season: int = YEAR, ip: int = MIN_IP, stat_type: int = 8):
     url = FG_BASE + '/leaders.aspx'
-    params = {
+    params: Dict[Text, Any] = {
         'pos': 'all',
         'stats': 'pit',
         'lg': 'all',
@@ -70,14 +71,14 @@ def pitchers(season: int = YEAR, ip: int = MIN_IP, stat_type: int = 8):
         'type': stat_type,
         'season': season,
     }
-    res = session.get(url, params=params)
+    res = SESSION.get(url, params=params)
     payload = csv_payload(res)
-    res = session.post(url, params=params, data=payload)
+    res = SESSION.post(url, params=params, data=payload)
 
 
 def splinter_test():
     base_url = FG_BASE + '/leaders.aspx'
-    params = {
+    params: Dict[Text, Any] = {
         'pos': 'all',
         'stats': 'pit',
         'lg': 'all',
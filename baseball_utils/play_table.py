@@ -0,0 +1,257 @@
+"""Columnar (struct-of-arrays) storage for a season of Retrosheet plays"""
+import gc
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Text, Type
+
+import attr
+import numpy as np
+
+from baseball_utils.retrosheet import (
+    Game,
+    Info,
+    Pitches,
+    Play,
+    Player,
+    parse_event,
+)
+from baseball_utils.util import default_attrs
+
+NO_COUNT = -1  # balls/strikes value when the count is unknown
+
+
+class Encoder(object):
+    """Assigns a dense integer code to each distinct string"""
+
+    def __init__(self) -> None:
+        self.codes: Dict[Text, int] = dict()
+        self.values: List[Text] = list()
+
+    def __call__(self, value: Text) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+@default_attrs()
+class PlayTable(object):
+    """Every play of a set of games, one NumPy array per field
+
+    Row i is the i-th play; strings (batter ids, event strings) are stored
+    as integer codes into `batters` and `events`. The pitch sequence for
+    row i is `pitch_buf[pitch_offsets[i]:pitch_offsets[i + 1]]`.
+    """
+
+    game: np.ndarray = attr.ib()  # int32, index of the game in the input
+    inning: np.ndarray = attr.ib()  # uint8
+    home: np.ndarray = attr.ib()  # bool
+    batter: np.ndarray = attr.ib()  # int32 code into batters
+    balls: np.ndarray = attr.ib()  # int8, NO_COUNT if unknown
+    strikes: np.ndarray = attr.ib()  # int8, NO_COUNT if unknown
+    event: np.ndarray = attr.ib()  # int32 code into events
+    pitch_offsets: np.ndarray = attr.ib()  # int64, len(self) + 1 entries
+    pitch_buf: np.ndarray = attr.ib()  # uint8, every pitch character
+    batters: List[Text] = attr.ib(factory=list, repr=False)
+    events: List[Text] = attr.ib(factory=list, repr=False)
+
+    @classmethod
+    def from_games(
+        cls: Type['PlayTable'], games: Iterable[Game]
+    ) -> 'PlayTable':
+        """Build a table from games, which may be a streaming iterator"""
+        batters, events = Encoder(), Encoder()
+        game, inning, home = array('i'), array('B'), array('b')
+        batter, event = array('i'), array('i')
+        balls, strikes = array('b'), array('b')
+        offsets = array('q', [0])
+        buf = bytearray()
+
+        for i, gm in enumerate(games):
+            for play in gm.plays:
+                game.append(i)
+                inning.append(play.inning)
+                home.append(play.home_team)
+                batter.append(batters(play.batter_id))
+                event.append(events(play.event.cts))
+                if play.count is None:
+                    balls.append(NO_COUNT)
+                    strikes.append(NO_COUNT)
+                else:
+                    balls.append(play.count[0])
+                    strikes.append(play.count[1])
+                if play.pitches is not None:
+                    buf.extend(''.join(play.pitches.pitch_list).encode())
+                offsets.append(len(buf))
+
+        return cls(
+            np.frombuffer(game, dtype=np.int32),
+            np.frombuffer(inning, dtype=np.uint8),
+            np.frombuffer(home, dtype=np.int8).astype(bool),
+            np.frombuffer(batter, dtype=np.int32),
+            np.frombuffer(balls, dtype=np.int8),
+            np.frombuffer(strikes, dtype=np.int8),
+            np.frombuffer(event, dtype=np.int32),
+            np.frombuffer(offsets, dtype=np.int64),
+            np.frombuffer(bytes(buf), dtype=np.uint8),
+            batters.values,
+            events.values,
+        )
+
+    def __len__(self) -> int:
+        return len(self.inning)
+
+    @property
+    def num_pitches(self) -> np.ndarray:
+        return np.diff(self.pitch_offsets)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the array data (excluding the string tables)"""
+        arrays = (getattr(self, a.name) for a in attr.fields(type(self)))
+        return sum(a.nbytes for a in arrays if isinstance(a, np.ndarray))
+
+    def pitches(self, row: int) -> Text:
+        start, stop = self.pitch_offsets[row], self.pitch_offsets[row + 1]
+        return self.pitch_buf[start:stop].tobytes().decode()
+
+    def batter_rows(self, batter_id: Text) -> np.ndarray:
+        """Indices of every play by a batter"""
+        try:
+            code = self.batters.index(batter_id)
+        except ValueError:
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(self.batter == code)
+
+    def event_counts(self) -> Dict[Text, int]:
+        counts = np.bincount(self.event, minlength=len(self.events))
+        return dict(zip(self.events, counts.tolist()))
+
+
+INFO_FIELDS = tuple(a.name for a in attr.fields(Info))
+START_DT = INFO_FIELDS.index('start_dt')
+
+
+def player_row(player: Player) -> List[Any]:
+    return [
+        player.retro_id,
+        player.name,
+        player.home,
+        player.batting_pos,
+        player.fielding_pos,
+    ]
+
+
+@default_attrs()
+class GameTable(object):
+    """Everything about a set of games that their PlayTable leaves out
+
+    One row of plain (JSON-friendly) values per game: the Info fields in
+    INFO_FIELDS order, with start_dt as its timetuple()[:6]; the starters
+    and subs; and the game's comments. `play_com` holds the comments of
+    the few plays that have any, by PlayTable row. Together with a
+    PlayTable of the same games, `to_games` rebuilds them exactly.
+    """
+
+    info: List[List[Any]] = attr.ib(factory=list)
+    starters: List[List[List[Any]]] = attr.ib(factory=list)
+    subs: List[List[List[Any]]] = attr.ib(factory=list)
+    com: List[List[Text]] = attr.ib(factory=list)
+    play_com: List[List[Any]] = attr.ib(factory=list)  # [row, comments]
+
+    @classmethod
+    def from_games(
+        cls: Type['GameTable'], games: Iterable[Game]
+    ) -> 'GameTable':
+        table = cls()
+        row = 0
+        for gm in games:
+            info = [getattr(gm.info, name) for name in INFO_FIELDS]
+            info[START_DT] = list(gm.info.start_dt.timetuple()[:6])
+            table.info.append(info)
+            table.starters.append([player_row(p) for p in gm.starters])
+            table.subs.append([player_row(p) for p in gm.subs])
+            table.com.append(list(gm.com))
+            for play in gm.plays:
+                if play.com:
+                    table.play_com.append([row, list(play.com)])
+                row += 1
+        return table
+
+    def __len__(self) -> int:
+        return len(self.info)
+
+    def to_games(self, plays: PlayTable) -> List[Game]:
+        """Rebuild the games that this table and `plays` were made from
+
+        The garbage collector is paused meanwhile: none of the objects made
+        here can be garbage, and the collections their number would set off
+        otherwise take longer than building them.
+        """
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._to_games(plays)
+        finally:
+            if enabled:
+                gc.enable()
+
+    def _to_games(self, plays: PlayTable) -> List[Game]:
+        games: List[Game] = []
+        for i, values in enumerate(self.info):
+            info = list(values)
+            info[START_DT] = datetime(*info[START_DT])
+            games.append(
+                Game(
+                    Info(*info),
+                    [Player(*p) for p in self.starters[i]],
+                    [Player(*p) for p in self.subs[i]],
+                    [],
+                    list(self.com[i]),
+                )
+            )
+
+        batters = plays.batters
+        events = [parse_event(cts) for cts in plays.events]
+        coms = {row: com for row, com in self.play_com}
+        offsets = plays.pitch_offsets.tolist()
+        buf = plays.pitch_buf.tobytes()
+        decoded = buf.decode()
+        # Offsets are in bytes, so they only index the text if it's ASCII
+        text = decoded if len(decoded) == len(buf) else None
+
+        columns = (
+            plays.game.tolist(),
+            plays.inning.tolist(),
+            plays.home.tolist(),
+            plays.batter.tolist(),
+            plays.balls.tolist(),
+            plays.strikes.tolist(),
+            plays.event.tolist(),
+            offsets[:-1],
+            offsets[1:],
+        )
+        game_plays = [gm.plays for gm in games]
+        for row, (g, inning, home, b, balls, strikes, e, start, stop) in (
+            enumerate(zip(*columns))
+        ):
+            pitches: Optional[Pitches] = None
+            if stop > start:
+                if text is not None:
+                    pitches = Pitches(list(text[start:stop]))
+                else:
+                    pitches = Pitches(list(buf[start:stop].decode()))
+            com = coms.get(row)
+            game_plays[g].append(
+                Play(
+                    inning,
+                    home,
+                    batters[b],
+                    events[e],
+                    None if balls == NO_COUNT else (balls, strikes),
+                    pitches,
+                    list(com) if com else [],
+                )
+            )
+        return games
@@ -1,19 +1,83 @@
-import sys
+import json
 import os
-from typing import Text, List, Dict
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Set, Text, Tuple
+from zipfile import BadZipFile, ZipFile, is_zipfile
 
 import attr
+import numpy as np
 
-from baseball_utils.download import retrosheet_seasons
-from baseball_utils.retrosheet import parse, Game
+from baseball_utils.const import Retrosheet
+from baseball_utils.download import retrosheet_event_zip, retrosheet_seasons
+from baseball_utils.manifest import (
+    HASH_CHUNK,
+    Manifest,
+    member_fingerprint,
+    source_key,
+)
+from baseball_utils.play_table import GameTable, PlayTable
+from baseball_utils.retrosheet import (
+    Game,
+    index_event_file,
+    iter_source_games,
+    read_game,
+    zip_event_names,
+)
+from baseball_utils.types import EventSource, GameIndex, Path, SeasonCache
 from baseball_utils.util import default_attrs
 
 
+# Bump whenever the parsed representation changes to invalidate old caches
+CACHE_VERSION = 4
+PLAY_ARRAYS = tuple(
+    a.name for a in attr.fields(PlayTable) if a.type is np.ndarray
+)
+
+
+def parse_file(source: EventSource) -> List[Game]:
+    """Parse a single event file"""
+    return list(iter_source_games(source))
+
+
+def pack_file(source: EventSource) -> Tuple[PlayTable, GameTable]:
+    """Parse a single event file into tables (module level so it can be
+    pickled)
+
+    Worker processes send these back rather than the games: pickling a
+    file's Game/Play/Event objects costs more than parsing it does.
+    """
+    games = parse_file(source)
+    return PlayTable.from_games(games), GameTable.from_games(games)
+
+
+def parse_files(sources: List[EventSource], jobs: int = 1) -> List[List[Game]]:
+    """Parse several event files, in parallel if jobs > 1, keeping order"""
+    if jobs > 1 and len(sources) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            packed = pool.map(pack_file, sources, chunksize=4)
+            return [table.to_games(plays) for plays, table in packed]
+    return [parse_file(source) for source in sources]
+
+
+def file_crc(path: Path) -> int:
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
 @default_attrs()
 class RetrosheetData(object):
     retro_dir: Text = attr.ib()
+    unzip: bool = attr.ib(default=True)  # Read from zips when False
+    cache: bool = attr.ib(default=True)  # Keep parsed seasons on disk
     _yd: List[Text] = attr.ib(factory=list, repr=False)
     _gms: Dict[int, List[Game]] = attr.ib(factory=dict, repr=False)
+    _idx: Dict[EventSource, GameIndex] = attr.ib(factory=dict, repr=False)
+    _mf: Optional[Manifest] = attr.ib(default=None, repr=False)
 
     @property
     def zip_dir(self):
@@ -23,11 +87,22 @@ class RetrosheetData(object):
     def data_dir(self) -> Text:
         return os.path.join(self.retro_dir, 'events', 'data')
 
+    @property
+    def cache_dir(self) -> Text:
+        return os.path.join(self.retro_dir, 'events', 'parsed')
+
+    @property
+    def manifest(self) -> Manifest:
+        if self._mf is None:
+            path = os.path.join(self.retro_dir, 'events', 'manifest.json')
+            self._mf = Manifest.load(path)
+        return self._mf
+
     @property
     def year_dirs(self) -> List[Text]:
         if not self._yd or not os.listdir(self.retro_dir):
             self._yd = retrosheet_seasons(
-                self.retro_dir, self.zip_dir, self.data_dir
+                self.retro_dir, self.zip_dir, self.data_dir, unzip=self.unzip
             )
         return self._yd
 
@@ -39,24 +114,300 @@ class RetrosheetData(object):
             ret[int(name[:4])] = folder
         return ret
 
-    def event_files(self, year: int):
+    def event_files(self, year: int) -> List[EventSource]:
         assert year in self.years
         folder = self.years[year]
-        ret = []
-        for elem in os.listdir(folder):
-            if elem.endswith('.EVA') or elem.endswith('.EVN'):
+        if os.path.isfile(folder) and is_zipfile(folder):
+            with ZipFile(folder) as z:
+                return [(folder, name) for name in zip_event_names(z)]
+
+        ret: List[EventSource] = []
+        for elem in sorted(os.listdir(folder)):
+            if elem.endswith(Retrosheet.event_exts):
                 path = os.path.join(folder, elem)
                 ret.append(path)
         return ret
 
-    def games(self, year: int):
+    def iter_games(self, year: int) -> Iterator[Game]:
+        """Stream every game of a season without caching it"""
+        assert year in self.years
+        for source in self.event_files(year):
+            yield from iter_source_games(source)
+
+    def game_index(self, source: EventSource) -> GameIndex:
+        if source not in self._idx:
+            self._idx[source] = index_event_file(source)
+        return self._idx[source]
+
+    def game(self, game_id: Text) -> Game:
+        """Parse a single game by id without parsing the rest of its file
+
+        Games are listed in the home team's event file, so that file is
+        checked first; every file is indexed once and the index is kept.
+        """
+        year = Retrosheet.game_date(game_id).year
+        if year not in self.years:
+            raise KeyError(game_id)
+
+        prefix = '{0}{1}'.format(year, game_id[Retrosheet.team_s])
+
+        def _home_first(source: EventSource) -> bool:
+            if isinstance(source, tuple):
+                name = source[1]
+            else:
+                name = os.path.basename(source)
+            return not name.upper().startswith(prefix)
+
+        for source in sorted(self.event_files(year), key=_home_first):
+            span = self.game_index(source).get(game_id)
+            if span is not None:
+                return read_game(source, span)
+        raise KeyError(game_id)
+
+    def games(self, year: int, jobs: int = 1) -> List[Game]:
+        """All games for a season
+
+        :param jobs: number of worker processes used to parse the season's
+            event files (1 parses in this process)
+        """
         assert year in self.years
-        if year not in self._gms or not self._gms[year]:
-            self._gms[year] = list()
-            for file in self.event_files(year):
-                with open(file) as f:
-                    self._gms[year].extend(parse(f))
-        return self._gms[year]
+        return self.games_range(year, year, jobs=jobs)[year]
+
+    def games_range(
+        self, start: int, end: int, jobs: int = 1
+    ) -> Dict[int, List[Game]]:
+        """All games for every season from start to end (inclusive)
+
+        Seasons are taken from memory, then from the on-disk cache. Event
+        files that aren't cached (or have changed) are fanned out over a
+        single process pool; results are merged back in year/file order, so
+        the output is the same regardless of the number of jobs.
+        """
+        years = [y for y in range(start, end + 1) if y in self.years]
+        todo = [y for y in years if not self._gms.get(y)]
+        if todo:
+            self.load_seasons(todo, jobs=jobs)
+        return {y: self._gms[y] for y in years}
+
+    def load_seasons(
+        self, years: List[int], jobs: int = 1
+    ) -> Dict[int, List[Text]]:
+        """(Re)load seasons, only parsing event files that have changed
+
+        Returns the manifest keys of the files that were parsed, by year.
+        """
+        seasons: Dict[int, SeasonCache] = dict()
+        dirty: Set[int] = set()
+        stale: List[Tuple[int, EventSource]] = []
+        for year in years:
+            cached = self.load_cached(year) if self.cache else dict()
+            entries: SeasonCache = dict()
+            digests = self.source_digests(year)
+            for source in self.event_files(year):
+                key = source_key(source)
+                hit = cached.get(key)
+                if hit is not None and hit[0] == digests[key]:
+                    entries[key] = hit
+                else:
+                    entries[key] = (digests[key], [])
+                    stale.append((year, source))
+            if set(entries) != set(cached):
+                dirty.add(year)
+            seasons[year] = entries
+
+        parsed = parse_files([source for _, source in stale], jobs=jobs)
+        changed: Dict[int, List[Text]] = {year: [] for year in years}
+        for (year, source), gms in zip(stale, parsed):
+            key = source_key(source)
+            seasons[year][key] = (seasons[year][key][0], gms)
+            changed[year].append(key)
+            dirty.add(year)
+
+        for year, entries in seasons.items():
+            self._gms[year] = [g for _, gms in entries.values() for g in gms]
+            if self.cache and year in dirty:
+                self.store_cached(year, entries)
+        self.manifest.save()
+        return changed
+
+    def sync(
+        self, start: int, end: int, download: bool = True, jobs: int = 1
+    ) -> Dict[int, List[Text]]:
+        """Pick up upstream corrections for a range of seasons
+
+        Archives are re-fetched, members are only re-extracted if their
+        contents differ from what's on disk, and only the event files whose
+        fingerprint changed are re-parsed and merged into the cached
+        seasons. Returns the manifest keys of the re-parsed files by year.
+        """
+        # Scan every season first, so the ones synced below are added to
+        # the full list rather than becoming the whole of it
+        known = self.year_dirs
+        years = []
+        for year in range(start, end + 1):
+            if year not in Retrosheet.years:
+                continue
+            zpath: Optional[Path] = os.path.join(
+                self.zip_dir, '{0}eve.zip'.format(year)
+            )
+            if download:
+                if not os.path.isdir(self.zip_dir):
+                    os.makedirs(self.zip_dir)
+                zpath = retrosheet_event_zip(year, self.zip_dir, force=True)
+            if zpath is None or not os.path.isfile(zpath):
+                continue
+            folder: Optional[Path] = None
+            if self.manifest.check_file(zpath) and self.unzip:
+                folder = self.extract_changed(zpath)
+            elif not self.unzip:
+                folder = zpath
+            if folder is not None and folder not in known:
+                known.append(folder)
+            self._gms.pop(year, None)
+            self._idx.clear()
+            years.append(year)
+
+        return self.load_seasons([y for y in years if y in self.years], jobs)
+
+    def extract_changed(self, archive: Path) -> Path:
+        """Extract the members of an archive that differ from those on disk"""
+        name = os.path.splitext(os.path.basename(archive))[0]
+        out_path = os.path.join(self.data_dir, name)
+        with ZipFile(archive) as z:
+            for info in z.infolist():
+                target = os.path.join(out_path, info.filename)
+                if os.path.isfile(target) and file_crc(target) == info.CRC:
+                    continue
+                z.extract(info, out_path)
+        return out_path
+
+    def play_table(self, year: int, stream: bool = False) -> PlayTable:
+        """Columnar table of every play in a season
+
+        A cached season that isn't loaded yet comes straight from the
+        cache's arrays, without rebuilding its games.
+
+        :param stream: build straight from the event files without keeping
+            (or caching) the parsed games
+        """
+        if stream:
+            return PlayTable.from_games(self.iter_games(year))
+        if self.cache and year not in self._gms:
+            plays = self.cached_play_table(year)
+            if plays is not None:
+                return plays
+        return PlayTable.from_games(self.games(year))
+
+    def source_digests(self, year: int) -> Dict[Text, Text]:
+        """Content digest of each of a season's event files, by manifest key
+
+        Zip members use their stored CRC; files on disk are only re-hashed
+        when their size or mtime differ from the manifest.
+        """
+        folder = self.years[year]
+        ret: Dict[Text, Text] = dict()
+        if os.path.isfile(folder) and is_zipfile(folder):
+            self.manifest.check_file(folder)
+            with ZipFile(folder) as z:
+                for info in z.infolist():
+                    key = source_key((folder, info.filename))
+                    fp = member_fingerprint(info)
+                    self.manifest.entries[key] = fp
+                    ret[key] = fp.digest
+            return ret
+
+        for source in self.event_files(year):
+            key = source_key(source)
+            self.manifest.check_file(key)
+            ret[key] = self.manifest.entries[key].digest
+        return ret
+
+    def cache_file(self, year: int) -> Text:
+        return os.path.join(self.cache_dir, '{0}.npz'.format(year))
+
+    def read_cache(
+        self, year: int
+    ) -> Optional[Tuple[Dict[Text, Any], PlayTable]]:
+        """A season's cache metadata and PlayTable, or None if there's no
+        usable cache for it
+        """
+        path = self.cache_file(year)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                meta = json.loads(npz['meta'].tobytes().decode('utf-8'))
+                if meta['version'] != CACHE_VERSION:
+                    return None
+                arrays = {name: npz[name] for name in PLAY_ARRAYS}
+        except (OSError, ValueError, KeyError, BadZipFile):
+            return None
+        plays = PlayTable(
+            batters=meta['batters'], events=meta['events'], **arrays
+        )
+        return meta, plays
+
+    def load_cached(self, year: int) -> SeasonCache:
+        """Load a parsed season from disk as {key: (digest, games)}
+
+        The games are rebuilt from the season's PlayTable and GameTable
+        (see `store_cached`).
+        """
+        cached = self.read_cache(year)
+        if cached is None:
+            return dict()
+        meta, plays = cached
+        games = GameTable(**meta['games']).to_games(plays)
+        entries: SeasonCache = dict()
+        start = 0
+        for key, digest, count in meta['files']:
+            entries[key] = (digest, games[start : start + count])
+            start += count
+        return entries
+
+    def cached_play_table(self, year: int) -> Optional[PlayTable]:
+        """A season's PlayTable straight from the cache, without rebuilding
+        its games; None unless every event file is cached and unchanged
+        """
+        cached = self.read_cache(year)
+        if cached is None:
+            return None
+        meta, plays = cached
+        digests = {key: digest for key, digest, _ in meta['files']}
+        if digests != self.source_digests(year):
+            return None
+        return plays
+
+    def store_cached(self, year: int, entries: SeasonCache) -> Text:
+        """Write a parsed season to disk, keeping each file's digest
+
+        The season is stored as a compressed .npz of its PlayTable's
+        arrays, with the string tables, a GameTable and the digest and
+        number of games of each event file as JSON alongside them.
+        """
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        games = [g for _, gms in entries.values() for g in gms]
+        plays = PlayTable.from_games(games)
+        meta = {
+            'version': CACHE_VERSION,
+            'files': [
+                [key, digest, len(gms)]
+                for key, (digest, gms) in entries.items()
+            ],
+            'batters': plays.batters,
+            'events': plays.events,
+            'games': attr.asdict(GameTable.from_games(games)),
+        }
+        encoded = json.dumps(meta).encode('utf-8')
+        arrays = {name: getattr(plays, name) for name in PLAY_ARRAYS}
+        path = self.cache_file(year)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            meta_array = np.frombuffer(encoded, dtype=np.uint8)
+            np.savez_compressed(f, meta=meta_array, **arrays)
+        os.replace(tmp, path)
+        return path
 
 
 def main():
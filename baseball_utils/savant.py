@@ -1,69 +1,215 @@
+"""Lookup tables from Baseball Savant's Statcast search page
+
+Every select list on the page is parsed in one pass into a
+`SavantSnapshot`, which is kept (with its TTL) in the Savant's value cache
+-- on disk by default -- so player ids, team names and the player name
+index cost no network until the snapshot expires.
+"""
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
 from datetime import timedelta
-from typing import ClassVar, Dict, Text, Tuple, Set, cast
+from difflib import SequenceMatcher
+from typing import (
+    ClassVar,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Text,
+    Tuple,
+)
 
 import attr
+from bs4 import BeautifulSoup, SoupStrainer
 from requests import Session
 
-from baseball_utils.types import IdDict
-from baseball_utils.util import create_soup, default_attrs, CachedValue
+from baseball_utils.cache import CacheBackend, FileCache
+from baseball_utils.types import IdDict, SelectDict
+from baseball_utils.util import PARSER, CachedValue, default_attrs
+
+SNAPSHOT_TIMEOUT = timedelta(days=1)
+PLAYER_SELECT = 'batters_lookup'
+TEAM_SELECT = 'stadium'
+FUZZY_CANDIDATES = 50  # names scored in full for a fuzzy search
+
+_NOT_WORD = re.compile(r'[^a-z0-9 ]+')
+
+
+def normalize(name: Text) -> Text:
+    """Lower case, without accents, punctuation or repeated spaces"""
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    return ' '.join(_NOT_WORD.sub('', name.lower()).split())
+
+
+def trigrams(key: Text) -> Set[Text]:
+    padded = '  {0} '.format(key)
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+@default_attrs()
+class NameIndex(object):
+    """Exact, prefix and fuzzy player search over Savant's player list
+
+    Names are indexed both as 'first last' and 'last first', so a search
+    can start with either.
+    """
+
+    # Sorted (normalized name, player id), two per player
+    keys: List[Tuple[Text, Text]] = attr.ib(factory=list, repr=False)
+    exact: Dict[Text, List[Text]] = attr.ib(factory=dict, repr=False)
+    grams: Dict[Text, List[int]] = attr.ib(factory=dict, repr=False)
+
+    @classmethod
+    def from_ids(cls, ids: IdDict) -> 'NameIndex':
+        keys = []
+        for pid, (last, first) in ids.items():
+            keys.append((normalize('{0} {1}'.format(first, last)), pid))
+            keys.append((normalize('{0} {1}'.format(last, first)), pid))
+        keys.sort()
+        exact: Dict[Text, List[Text]] = dict()
+        grams: Dict[Text, List[int]] = dict()
+        for i, (key, pid) in enumerate(keys):
+            exact.setdefault(key, []).append(pid)
+            for gram in trigrams(key):
+                grams.setdefault(gram, []).append(i)
+        return cls(keys, exact, grams)
+
+    def lookup(self, name: Text) -> List[Text]:
+        """Ids of the players with exactly this name"""
+        return list(self.exact.get(normalize(name), []))
+
+    def prefix(self, text: Text, limit: int = 10) -> List[Text]:
+        """Ids of players whose name starts with text, alphabetically"""
+        text = normalize(text)
+        ret: List[Text] = []
+        i = bisect_left(self.keys, (text, ''))
+        while i < len(self.keys) and len(ret) < limit:
+            key, pid = self.keys[i]
+            if not key.startswith(text):
+                break
+            if pid not in ret:
+                ret.append(pid)
+            i += 1
+        return ret
+
+    def fuzzy(
+        self, text: Text, limit: int = 10, cutoff: float = 0.6
+    ) -> List[Text]:
+        """Ids of the players with the closest names, best first
+
+        Candidates are the names sharing the most trigrams with text; only
+        those are compared in full.
+        """
+        text = normalize(text)
+        shared: Counter = Counter()
+        for gram in trigrams(text):
+            shared.update(self.grams.get(gram, ()))
+
+        scores: Dict[Text, float] = dict()
+        matcher = SequenceMatcher(b=text)
+        for i, _ in shared.most_common(FUZZY_CANDIDATES):
+            key, pid = self.keys[i]
+            matcher.set_seq1(key)
+            score = matcher.ratio()
+            if score >= cutoff and score > scores.get(pid, 0.0):
+                scores[pid] = score
+        return sorted(scores, key=scores.__getitem__, reverse=True)[:limit]
 
-ID_TIMEOUT = timedelta(days=1)
-NAME_TIMEOUT = timedelta(days=365)
+    def search(self, text: Text, limit: int = 10) -> List[Text]:
+        """Exact matches, then prefix matches, then fuzzy ones"""
+        ret = self.lookup(text)
+        for pid in self.prefix(text, limit) + self.fuzzy(text, limit):
+            if len(ret) >= limit:
+                break
+            if pid not in ret:
+                ret.append(pid)
+        return ret[:limit]
+
+
+@default_attrs()
+class SavantSnapshot(object):
+    """Every select list of the search page, plus what we derive from them"""
+
+    selects: SelectDict = attr.ib(repr=False)
+    ids: IdDict = attr.ib(factory=dict, repr=False)
+    team_names: Set[Text] = attr.ib(factory=set, repr=False)
+    # Built once with the snapshot and kept (pickled) along with it
+    index: NameIndex = attr.ib(
+        default=attr.Factory(
+            lambda self: NameIndex.from_ids(self.ids), takes_self=True
+        ),
+        repr=False,
+        eq=False,
+    )
+
+    @classmethod
+    def from_html(cls, content: bytes) -> 'SavantSnapshot':
+        # Only the select lists are built into a tree
+        only = SoupStrainer('select')
+        soup = BeautifulSoup(content, PARSER, parse_only=only)
+        selects: SelectDict = dict()
+        for select in soup('select', id=True):
+            options = selects.setdefault(str(select['id']), dict())
+            for opt in select('option', value=True):
+                value = str(opt['value'])
+                if value:
+                    options[value] = opt.get_text().strip()
+
+        ids: IdDict = dict()
+        for pid, label in selects.get(PLAYER_SELECT, {}).items():
+            last, _, first = label.partition(',')
+            ids[pid] = (last.strip(), first.strip())
+        names = {n for n in selects.get(TEAM_SELECT, {}).values() if n}
+        return cls(selects, ids, names)
+
+
+def _snapshot_value(savant: 'Savant') -> CachedValue[SavantSnapshot]:
+    backend = savant.value_cache
+    if backend is None:
+        backend = FileCache()
+    return CachedValue(SNAPSHOT_TIMEOUT, backend=backend, key='savant:page')
 
 
 @default_attrs()
 class Savant(object):
     url: ClassVar[Text] = 'https://baseballsavant.mlb.com/statcast_search'
     session: Session = attr.ib()
-    _ids: CachedValue[IdDict] = attr.ib(default=CachedValue(ID_TIMEOUT))
-    _names: CachedValue[Set[Text]] = attr.ib(default=CachedValue(NAME_TIMEOUT))
+    # Where the snapshot is kept (a FileCache if None)
+    value_cache: Optional[CacheBackend] = attr.ib(default=None, repr=False)
+    _snapshot: CachedValue[SavantSnapshot] = attr.ib(
+        default=attr.Factory(_snapshot_value, takes_self=True), repr=False
+    )
 
     @property
-    def ids(self) -> IdDict:
-        if self._ids.timed_out:
-            self._ids.clear()
-        if not self._ids.is_none():
-            return self._ids.get()
+    def snapshot(self) -> SavantSnapshot:
+        return self._snapshot.get_or_load(self.fetch_snapshot)
 
+    def fetch_snapshot(self) -> SavantSnapshot:
+        # Not through an HTTP cache: the snapshot itself is what's kept
         res = self.session.get(self.url)
         res.raise_for_status()
-        soup = create_soup(res.content)
-        attrs = {
-            'class': 'form-control chosen-select',
-            'id': 'batters_lookup',
-            'name': 'batters_lookup[]',
-        }
-        select = soup.find('select', attrs=attrs)
-        assert select is not None
-        ret = dict()
-        for opt in select('option', value=True):
-            name = tuple(map(str.strip, opt.string.split(',')))
-            ret[opt['value']] = cast(Tuple[str, str], name)
-        self._ids.refresh(ret)
-
-        return self._ids.get()
+        ret = SavantSnapshot.from_html(res.content)
+        assert ret.ids and ret.team_names
+        return ret
 
     @property
-    def team_names(self) -> Set[Text]:
-        if self._names.timed_out:
-            self._names.clear()
-        if not self._names.is_none:
-            return self._names.get()
+    def ids(self) -> IdDict:
+        return self.snapshot.ids
 
-        res = self.session.get(self.url)
-        res.raise_for_status()
-        soup = create_soup(res.content)
-        attrs = {'class': 'form-control', 'id': 'stadium', 'name': 'stadium'}
-        select = soup.find('select', attrs=attrs)
-        assert select is not None
-        ret = set()
-        for opt in select('option', value=True):
-            name = opt.string.strip()
-            if name:
-                ret.add(name)
-        self._names.refresh(ret)
-
-        return self.team_names
+    @property
+    def team_names(self) -> Set[Text]:
+        return self.snapshot.team_names
 
     def longest_team_name(self) -> Text:
         return max(self.team_names, key=len)
+
+    def player_ids(self, name: Text) -> List[Text]:
+        """Ids of the players with exactly this name (either order)"""
+        return self.snapshot.index.lookup(name)
+
+    def search_players(self, text: Text, limit: int = 10) -> List[Text]:
+        """Ids of the players best matching a partial or misspelled name"""
+        return self.snapshot.index.search(text, limit)
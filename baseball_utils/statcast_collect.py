@@ -16,10 +16,34 @@ Snippet from baseballsavant.mlb.com/statcast_search
 
 Parse through the above to get player names/ids
 
-Sequentially request data from 2008 to the present year
+Request data from 2008 to the present year: each season is split into date
+windows small enough to stay under Savant's row cap, the windows' CSVs are
+downloaded concurrently and each one is parsed as it streams in, straight
+into the columns of an append-only `ColumnStore` (one partition per
+window).
+
+After that, `StatcastCollector.sync` keeps the store current: it records
+the last day whose pitches are stored and only asks for the days after it.
 
 Problem: How do we tell who is a pitcher and who is a catcher?
 """
+import copy
+import csv
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Text, Tuple
+
+import attr
+import numpy as np
+import requests
+
+from baseball_utils.column_store import ColumnBuilder, ColumnStore
+from baseball_utils.http_client import RETRY_STATUS, retry_after
+from baseball_utils.savant import Savant
+from baseball_utils.types import ColumnSchema, Path
+from baseball_utils.util import date_range, default_attrs, parse_date
 
 statcast_url = 'https://baseballsavant.mlb.com/statcast_search'
 
@@ -100,5 +124,318 @@ csv_headers = {
     'player_event_sort': 'h_launch_speed',
     'sort_order': 'desc',
     'min_abs': 0,
-    'type': 'details'
+    'type': 'details',
+}
+
+ROW_CAP = 25000  # most rows Savant returns for one search
+WINDOW_DAYS = 5  # a busy week of games stays under ROW_CAP in 5 days
+SEASON_START = (3, 1)  # (month, day); includes spring openers abroad
+SEASON_END = (11, 30)
+SYNC_LAG = 1  # days; yesterday's games are the newest ones known final
+THROUGH = 'through'  # store info key: the last fully ingested day
+
+# Columns kept from the CSV, in order
+STATCAST_COLUMNS: ColumnSchema = {
+    'game_date': 'M8[D]',
+    'game_pk': 'i4',
+    'at_bat_number': 'i2',
+    'pitch_number': 'i2',
+    'pitcher': 'i4',  # MLBAM player ids (the keys of Savant.ids)
+    'batter': 'i4',
+    'pitch_type': 'i2',
+    'type': 'i2',  # 'B', 'S' or 'X'
+    'description': 'i2',
+    'events': 'i2',
+    'stand': 'i2',
+    'p_throws': 'i2',
+    'home_team': 'i2',
+    'away_team': 'i2',
+    'inning': 'i1',  # signed, so a missing one is NO_VALUE and not 255
+    'top': '?',
+    'balls': 'i1',
+    'strikes': 'i1',
+    'outs_when_up': 'i1',
+    'zone': 'i1',
+    'release_speed': 'f4',
+    'effective_speed': 'f4',
+    'release_spin_rate': 'f4',
+    'release_extension': 'f4',
+    'pfx_x': 'f4',
+    'pfx_z': 'f4',
+    'plate_x': 'f4',
+    'plate_z': 'f4',
+    'launch_speed': 'f4',
+    'launch_angle': 'f4',
 }
+STATCAST_STRINGS = (
+    'pitch_type',
+    'type',
+    'description',
+    'events',
+    'stand',
+    'p_throws',
+    'home_team',
+    'away_team',
+)
+STATCAST_SOURCES = {'top': 'inning_topbot'}
+STATCAST_CONVERTERS = {'top': lambda v: v == 'Top'}
+
+Window = Tuple[date, date]  # first and last day, inclusive
+
+
+class StatcastError(Exception):
+    pass
+
+
+def statcast_store(root: Path) -> ColumnStore:
+    """The on-disk pitch store the collector appends to"""
+    return ColumnStore(root, STATCAST_COLUMNS, STATCAST_STRINGS)
+
+
+def season_bounds(year: int) -> Window:
+    return date(year, *SEASON_START), date(year, *SEASON_END)
+
+
+def date_windows(
+    start: date, end: date, days: int = WINDOW_DAYS
+) -> Iterator[Window]:
+    """Split start..end (inclusive) into consecutive windows of days"""
+    step = timedelta(days=days - 1)
+    while start <= end:
+        stop = min(start + step, end)
+        yield start, stop
+        start = stop + timedelta(days=1)
+
+
+def window_name(window: Window) -> Text:
+    return '{0}_{1}'.format(window[0].isoformat(), window[1].isoformat())
+
+
+def parse_window(name: Text) -> Window:
+    first, last = name.split('#')[0].split('_')
+    return parse_date(first), parse_date(last)
+
+
+def csv_params(window: Window) -> Dict[Text, Text]:
+    """Search parameters for every regular season pitch in a window"""
+    params = copy.copy(csv_headers)
+    del params['player_lookup[]']
+    params.update(
+        {
+            'all': 'true',
+            'hfSea': '{0}|'.format(window[0].year),
+            'game_date_gt': window[0].isoformat(),
+            'game_date_lt': window[1].isoformat(),
+        }
+    )
+    return {k: str(v) for k, v in params.items()}
+
+
+@default_attrs()
+class Chunk(object):
+    """One window's pitches, as columns ready to append to a store"""
+
+    window: Window = attr.ib()
+    columns: Dict[Text, np.ndarray] = attr.ib(repr=False)
+    strings: Dict[Text, List[Text]] = attr.ib(repr=False)
+
+    def __len__(self) -> int:
+        return len(self.columns['game_date'])
+
+    @property
+    def name(self) -> Text:
+        return window_name(self.window)
+
+
+def parse_csv(window: Window, stream: io.TextIOBase) -> Chunk:
+    """Parse a search CSV row by row into columns"""
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        strings: Dict[Text, List[Text]] = {n: [] for n in STATCAST_STRINGS}
+        return Chunk(window, empty_columns(), strings)
+    builder = ColumnBuilder(
+        STATCAST_COLUMNS,
+        STATCAST_STRINGS,
+        header,
+        STATCAST_SOURCES,
+        STATCAST_CONVERTERS,
+    )
+    for row in reader:
+        if len(row) == len(header):
+            builder.add(row)
+    return Chunk(window, builder.columns(), builder.strings())
+
+
+def empty_columns() -> Dict[Text, np.ndarray]:
+    return {
+        name: np.empty(0, dtype=dtype)
+        for name, dtype in STATCAST_COLUMNS.items()
+    }
+
+
+@default_attrs()
+class StatcastCollector(object):
+    """Downloads seasons of pitches from Savant into a pitch store"""
+
+    savant: Savant = attr.ib()
+    store: ColumnStore = attr.ib()
+    workers: int = attr.ib(default=4)
+    window_days: int = attr.ib(default=WINDOW_DAYS)
+    retries: int = attr.ib(default=2)
+    backoff: float = attr.ib(default=0.5)  # seconds, doubled each retry
+
+    @property
+    def csv_url(self) -> Text:
+        return self.savant.url + '/csv'
+
+    def stored_days(self) -> Set[date]:
+        """Every day covered by a stored partition"""
+        days: Set[date] = set()
+        for name, _, _ in self.store.partitions:
+            days.update(date_range(*parse_window(name)))
+        return days
+
+    def missing_windows(self, start: date, end: date) -> Iterator[Window]:
+        """Windows covering the days from start to end that aren't stored"""
+        stored = self.stored_days()
+        run: List[date] = []
+        for day in date_range(start, end):
+            if day not in stored:
+                run.append(day)
+                continue
+            if run:
+                yield from date_windows(run[0], run[-1], self.window_days)
+                run = []
+        if run:
+            yield from date_windows(run[0], run[-1], self.window_days)
+
+    @property
+    def through(self) -> Optional[date]:
+        """The last day whose pitches have all been stored"""
+        value = self.store.info.get(THROUGH)
+        if value is not None:
+            return parse_date(value)
+        if not len(self.store):
+            return None
+        # A store built by `collect` alone: trust its newest day
+        newest = self.store.column('game_date').max()
+        return newest.astype(date) if not np.isnat(newest) else None
+
+    def fetch(self, window: Window) -> Chunk:
+        """Download and parse one window's CSV as it arrives"""
+        attempt = 0
+        while True:
+            try:
+                with self.savant.session.get(
+                    self.csv_url, params=csv_params(window), stream=True
+                ) as res:
+                    res.raise_for_status()
+                    res.raw.decode_content = True
+                    # Let the text wrapper see EOF instead of a closed file
+                    res.raw.auto_close = False
+                    text = io.TextIOWrapper(
+                        res.raw, encoding='utf-8-sig', newline=''
+                    )
+                    return parse_csv(window, text)
+            except requests.RequestException as e:
+                # Streamed requests aren't retried by the client itself, so
+                # back off here the way it would
+                failed = e.response
+                if attempt == self.retries or (
+                    failed is not None
+                    and failed.status_code not in RETRY_STATUS
+                ):
+                    raise
+                delay = retry_after(failed) if failed is not None else None
+                if delay is None:
+                    delay = self.backoff * 2 ** attempt
+                time.sleep(delay)
+                attempt += 1
+
+    def fetch_window(self, window: Window) -> List[Chunk]:
+        """A window's pitches, split into smaller windows if it hit the cap"""
+        chunk = self.fetch(window)
+        if len(chunk) < ROW_CAP:
+            return [chunk]
+        start, end = window
+        if start == end:
+            raise StatcastError(
+                '{0} has more than {1} pitches'.format(start, ROW_CAP)
+            )
+        mid = start + (end - start) // 2
+        return self.fetch_window((start, mid)) + self.fetch_window(
+            (mid + timedelta(days=1), end)
+        )
+
+    def collect(
+        self, start: date, end: date, verbose: bool = False
+    ) -> int:
+        """Store every window from start to end not already stored
+
+        Windows are fetched concurrently but appended in date order.
+        Returns the number of pitches added.
+        """
+        windows = list(self.missing_windows(start, end))
+        added = 0
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = [pool.submit(self.fetch_window, w) for w in windows]
+            for window, fut in zip(windows, futures):
+                for chunk in fut.result():
+                    # Part of a split window may be stored already
+                    if not self.store.has_partition(chunk.name):
+                        added += self.store.append(
+                            chunk.name, chunk.columns, chunk.strings
+                        )
+                if verbose:
+                    print('{0} to {1}'.format(*window))
+        return added
+
+    def collect_season(self, year: int, verbose: bool = False) -> int:
+        start, end = season_bounds(year)
+        end = min(end, date.today() - timedelta(days=SYNC_LAG))
+        return self.collect(start, end, verbose)
+
+    def sync(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        verbose: bool = False,
+    ) -> int:
+        """Append the days after the last fully ingested one
+
+        Only days that aren't stored yet are fetched, and windows without
+        any pitches add no partition; `through` still moves on past them,
+        so off days aren't asked for again. Returns the number of pitches
+        added.
+
+        :param start: first day for an empty store (default: the start of
+            this season)
+        :param end: last day to fetch (default, and at most: yesterday)
+        """
+        through = self.through
+        if through is not None:
+            start = through + timedelta(days=1)
+        elif start is None:
+            start = season_bounds(date.today().year)[0]
+        last = date.today() - timedelta(days=SYNC_LAG)
+        end = last if end is None else min(end, last)
+        if start > end:
+            return 0
+
+        windows = list(self.missing_windows(start, end))
+        added = 0
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = [pool.submit(self.fetch_window, w) for w in windows]
+            for window, fut in zip(windows, futures):
+                for chunk in fut.result():
+                    if not len(chunk):
+                        continue
+                    info = {THROUGH: chunk.window[1].isoformat()}
+                    added += self.store.append(
+                        chunk.name, chunk.columns, chunk.strings, info
+                    )
+                if verbose:
+                    print('{0} to {1}'.format(*window))
+        self.store.update_info({THROUGH: end.isoformat()})
+        return added
@@ -0,0 +1,278 @@
+"""Vectorized queries over a memory-mapped pitch store
+
+A `PitchQuery` is a store plus a boolean row mask. Filters narrow the mask
+with whole-column NumPy comparisons and aggregations run as single kernel
+calls: `np.bincount` when the group key is a small dense code (pitch type,
+zone, count) and sort + `ufunc.reduceat` for anything else (player ids,
+dates). Nothing is ever turned into per-pitch Python objects.
+
+Works on the Statcast store from `statcast_collect` and, for the columns
+they share (game_date, pitcher, batter, pitch_type, balls, strikes, zone),
+the Gameday store from `gameday_pitches`. Gameday keeps its own wording of
+pitch descriptions in `des`; `whiff_rate(name='des')` reads those.
+"""
+from datetime import date
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Text, Union
+
+import attr
+import numpy as np
+
+from baseball_utils.column_store import ColumnStore
+from baseball_utils.util import default_attrs, make_frozen
+
+PlayerId = Union[int, Text]  # MLBAM id, as in the keys of Savant.ids
+
+# Statcast descriptions that count as a swing, and as a swing and miss
+SWINGS: FrozenSet[Text] = make_frozen(
+    'swinging_strike',
+    'swinging_strike_blocked',
+    'foul',
+    'foul_tip',
+    'foul_bunt',
+    'missed_bunt',
+    'hit_into_play',
+    'hit_into_play_no_out',
+    'hit_into_play_score',
+)
+WHIFFS: FrozenSet[Text] = make_frozen(
+    'swinging_strike', 'swinging_strike_blocked', 'foul_tip', 'missed_bunt'
+)
+# The same, as Gameday's `des` words them
+GAMEDAY_SWINGS: FrozenSet[Text] = make_frozen(
+    'Swinging Strike',
+    'Swinging Strike (Blocked)',
+    'Swinging Pitchout',
+    'Foul',
+    'Foul Tip',
+    'Foul Bunt',
+    'Foul (Runner Going)',
+    'Foul Pitchout',
+    'Missed Bunt',
+    'In play, out(s)',
+    'In play, no out',
+    'In play, run(s)',
+)
+GAMEDAY_WHIFFS: FrozenSet[Text] = make_frozen(
+    'Swinging Strike',
+    'Swinging Strike (Blocked)',
+    'Swinging Pitchout',
+    'Foul Tip',
+    'Missed Bunt',
+)
+# Description column -> (swings, whiffs)
+DESCRIPTIONS = {
+    'description': (SWINGS, WHIFFS),
+    'des': (GAMEDAY_SWINGS, GAMEDAY_WHIFFS),
+}
+
+REDUCERS = {
+    'sum': np.add,
+    'min': np.minimum,
+    'max': np.maximum,
+}
+
+
+def _day(value: date) -> np.datetime64:
+    return np.datetime64(value, 'D')
+
+
+@default_attrs()
+class PitchQuery(object):
+    """A filtered view of a pitch store; filters return a new query"""
+
+    store: ColumnStore = attr.ib()
+    mask: Optional[np.ndarray] = attr.ib(default=None, repr=False)
+
+    def column(self, name: Text) -> np.ndarray:
+        return self.store.column(name)
+
+    def rows(self) -> np.ndarray:
+        """Indices of the selected rows"""
+        if self.mask is None:
+            return np.arange(len(self.store))
+        return np.flatnonzero(self.mask)
+
+    def __len__(self) -> int:
+        if self.mask is None:
+            return len(self.store)
+        return int(np.count_nonzero(self.mask))
+
+    def values(self, name: Text) -> np.ndarray:
+        """A column's values for the selected rows"""
+        col = self.column(name)
+        return col if self.mask is None else col[self.mask]
+
+    def filter(self, mask: np.ndarray) -> 'PitchQuery':
+        if self.mask is not None:
+            mask = mask & self.mask
+        return attr.evolve(self, mask=mask)
+
+    # Filters
+
+    def where(self, name: Text, *values: Any) -> 'PitchQuery':
+        """Rows whose column equals any of values (strings for coded ones)"""
+        col = self.column(name)
+        if name in self.store.strings:
+            values = tuple(self.store.code(name, v) for v in values)
+        if len(values) == 1:
+            return self.filter(col == values[0])
+        return self.filter(np.isin(col, values))
+
+    def pitcher(self, *ids: PlayerId) -> 'PitchQuery':
+        return self.where('pitcher', *(int(i) for i in ids))
+
+    def batter(self, *ids: PlayerId) -> 'PitchQuery':
+        return self.where('batter', *(int(i) for i in ids))
+
+    def pitch_type(self, *types: Text) -> 'PitchQuery':
+        return self.where('pitch_type', *types)
+
+    def dates(
+        self, start: Optional[date] = None, end: Optional[date] = None
+    ) -> 'PitchQuery':
+        """Rows from start to end (inclusive; either may be open)"""
+        col = self.column('game_date')
+        mask = np.ones(len(col), dtype=bool)
+        if start is not None:
+            mask &= col >= _day(start)
+        if end is not None:
+            mask &= col <= _day(end)
+        return self.filter(mask)
+
+    def count(
+        self, balls: Optional[int] = None, strikes: Optional[int] = None
+    ) -> 'PitchQuery':
+        """Rows thrown in a count (either half may be left open)"""
+        mask = np.ones(len(self.store), dtype=bool)
+        if balls is not None:
+            mask &= self.column('balls') == balls
+        if strikes is not None:
+            mask &= self.column('strikes') == strikes
+        return self.filter(mask)
+
+    def between(
+        self, name: Text, low: Optional[float], high: Optional[float]
+    ) -> 'PitchQuery':
+        col = self.column(name)
+        mask = np.ones(len(col), dtype=bool)
+        if low is not None:
+            mask &= col >= low
+        if high is not None:
+            mask &= col <= high
+        return self.filter(mask)
+
+    # Aggregates
+
+    def labels(self, name: Text, keys: Iterable[Any]) -> Iterable[Any]:
+        """Readable group labels for a column's raw values"""
+        if name in self.store.strings:
+            table = self.store.values(name)
+            return [table[k] for k in keys]
+        if np.dtype(self.store.schema[name]).kind == 'M':
+            return [np.datetime64(k, 'D').astype(date) for k in keys]
+        return [k.item() if hasattr(k, 'item') else k for k in keys]
+
+    def group(
+        self, by: Text, value: Optional[Text] = None, how: Text = 'mean'
+    ) -> Dict[Any, float]:
+        """Aggregate a column (or count rows) for each value of another
+
+        :param how: 'count', 'sum', 'mean', 'min' or 'max'; NaN values
+            are left out. All but 'count' need a value column.
+        """
+        if how not in ('count', 'mean') and how not in REDUCERS:
+            raise ValueError('unknown aggregate {0!r}'.format(how))
+        if how != 'count' and value is None:
+            raise ValueError('{0!r} needs a value column'.format(how))
+        keys = self.values(by)
+        if value is None or how == 'count':
+            weights = None
+        else:
+            weights = self.values(value).astype(np.float64)
+            valid = ~np.isnan(weights)
+            keys, weights = keys[valid], weights[valid]
+        if not len(keys):
+            return dict()
+
+        small = (
+            keys.dtype.kind in 'iub'
+            and keys.min() >= 0
+            and keys.max() < max(4 * len(keys), 1 << 16)
+        )
+        if small and how in ('count', 'sum', 'mean'):
+            return self._bincount(by, keys, weights, how)
+        return self._reduceat(by, keys, weights, how)
+
+    def _bincount(
+        self,
+        by: Text,
+        keys: np.ndarray,
+        weights: Optional[np.ndarray],
+        how: Text,
+    ) -> Dict[Any, float]:
+        keys = keys.astype(np.intp)
+        counts = np.bincount(keys)
+        present = np.flatnonzero(counts)
+        if how == 'count' or weights is None:
+            result: np.ndarray = counts[present]
+        else:
+            sums = np.bincount(keys, weights=weights)[present]
+            result = sums if how == 'sum' else sums / counts[present]
+        return dict(zip(self.labels(by, present), result.tolist()))
+
+    def _reduceat(
+        self,
+        by: Text,
+        keys: np.ndarray,
+        weights: Optional[np.ndarray],
+        how: Text,
+    ) -> Dict[Any, float]:
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        edges = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        starts = np.concatenate(([0], edges))
+        counts = np.diff(np.append(starts, len(keys)))
+        if how == 'count' or weights is None:
+            result = counts
+        elif how == 'mean':
+            result = np.add.reduceat(weights[order], starts) / counts
+        else:
+            result = REDUCERS[how].reduceat(weights[order], starts)
+        return dict(zip(self.labels(by, keys[starts]), result.tolist()))
+
+    def rate(
+        self, by: Text, hits: np.ndarray, of: Optional[np.ndarray] = None
+    ) -> Dict[Any, float]:
+        """Share of `of` rows (all selected rows by default) that are `hits`
+
+        Both are boolean masks over the whole store.
+        """
+        base = self if of is None else self.filter(of)
+        totals = base.group(by, how='count')
+        made = base.filter(hits).group(by, how='count')
+        return {k: made.get(k, 0.0) / n for k, n in totals.items()}
+
+    def description_mask(
+        self, descriptions: Iterable[Text], name: Text = 'description'
+    ) -> np.ndarray:
+        codes = [self.store.code(name, d) for d in descriptions]
+        return np.isin(self.column(name), [c for c in codes if c >= 0])
+
+    def whiff_rate(
+        self, by: Text = 'zone', name: Text = 'description'
+    ) -> Dict[Any, float]:
+        """Swings and misses per swing, for each value of `by`
+
+        :param name: the description column: 'description' (Statcast) or
+            'des' (Gameday)
+        """
+        swings, whiffs = DESCRIPTIONS[name]
+        return self.rate(
+            by,
+            self.description_mask(whiffs, name),
+            self.description_mask(swings, name),
+        )
+
+    def mean(self, value: Text) -> float:
+        values = self.values(value)
+        return float(np.nanmean(values)) if len(values) else float('nan')
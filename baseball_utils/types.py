@@ -1,10 +1,13 @@
 import enum
+import mmap
 from typing import (
+    Any,
     BinaryIO,
     ByteString,
     Dict,
     FrozenSet,
     Generator,
+    List,
     Text,
     TextIO,
     Tuple,
@@ -23,6 +26,9 @@ FPSetType = FrozenSet[Tuple[int, Text]]
 TextStream = TextIO
 AnyStream = Union[TextIO, BinaryIO]
 CountType = Tuple[int, int]
+# Anything with bytes' find() and slicing (not memoryview, which has no find)
+Buffer = Union[bytes, bytearray, mmap.mmap]
+GameIndex = Dict[Text, Tuple[int, int]]  # game id -> byte range
 
 # util.py
 BytesIterGen = Generator[ByteString, None, None]
@@ -31,6 +37,7 @@ FileIterGen = Union[BytesIterGen, TextIterGen]
 
 # savant.py
 IdDict = Dict[Text, Tuple[Text, Text]]
+SelectDict = Dict[Text, Dict[Text, Text]]  # select id -> value -> label
 
 # fangraphs.py
 FGParams = TypedDict(
@@ -51,3 +58,10 @@ TempParams = Dict[Text, Union[Text, int]]
 
 # download.py
 Path = Text
+
+# retro_collect.py
+EventSource = Union[Path, Tuple[Path, Text]]  # file or (zip, member)
+SeasonCache = Dict[Text, Tuple[Text, List[Any]]]  # key -> (digest, games)
+
+# column_store.py
+ColumnSchema = Dict[Text, Text]  # column name -> NumPy dtype
@@ -1,16 +1,27 @@
+import contextlib
 import functools
-from datetime import datetime, timedelta
+import io
+import math
+import mmap
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
 from typing import (
+    TYPE_CHECKING,
     Any,
     BinaryIO,
     ByteString,
+    Callable,
     Dict,
     FrozenSet,
     Generator,
     Generic,
+    Iterator,
     Optional,
     Text,
     TextIO,
+    Tuple,
     TypeVar,
     Union,
     cast,
@@ -18,13 +29,20 @@ from typing import (
 from urllib.parse import urljoin, urlparse, urlunparse
 
 import attr
-import requests
 from bs4 import BeautifulSoup, Tag
 
-from baseball_utils.types import AnyStream, BytesIterGen, FileIterGen
+# SESSION is kept here for code written before http_client existed
+from baseball_utils.http_client import SESSION, TokenBucket  # noqa: F401
+from baseball_utils.types import (
+    AnyStream,
+    Buffer,
+    BytesIterGen,
+    FileIterGen,
+)
 
+if TYPE_CHECKING:
+    from baseball_utils.cache import CacheBackend  # noqa: F401
 
-SESSION = requests.Session()
 
 THIS_YEAR = datetime.now().year
 
@@ -33,13 +51,25 @@ utf8open = functools.partial(open, encoding='utf-8')
 
 PARSER = 'lxml'
 
+WHITESPACE = frozenset(b' \t\r\n\x0b\x0c')
+CR = ord('\r')
+
 
 def create_soup(content: ByteString) -> BeautifulSoup:
     return BeautifulSoup(content, PARSER)
 
 
-def default_attrs():
-    return attr.s(slots=True, auto_attribs=True)
+if TYPE_CHECKING:
+    # The same classes as far as mypy's attrs plugin can tell, which it
+    # doesn't see through the wrappers below
+    from attr import define as default_attrs, frozen as frozen_attrs
+else:
+
+    def default_attrs():
+        return attr.s(slots=True, auto_attribs=True)
+
+    def frozen_attrs():
+        return attr.s(slots=True, auto_attribs=True, frozen=True)
 
 
 def home_away_vals(t: Optional[Tag]) -> Dict[Text, int]:
@@ -79,14 +109,14 @@ def file_iter(
     strip: bool = False,
     chunk_size: int = 1024
 ) -> FileIterGen:
-    if isinstance(file, TextIO):
+    if isinstance(file, (io.TextIOBase, TextIO)):
         # Text File
         for line in file:
             if strip:
                 line = line.strip()
             yield line
 
-    elif isinstance(file, BinaryIO):
+    elif isinstance(file, (io.IOBase, BinaryIO)):
         # Binary File
         cts = file.read(chunk_size)
         while cts:
@@ -97,7 +127,116 @@ def file_iter(
         # Got a file name
         with open(file, mode) as f:
             f = cast(AnyStream, f)
-            return file_iter(f, mode, strip=strip, chunk_size=chunk_size)
+            yield from file_iter(f, mode, strip=strip, chunk_size=chunk_size)
+
+
+def iter_line_spans(
+    buf: Buffer, *, strip: bool = False
+) -> Iterator[Tuple[int, int]]:
+    """Yield the (start, stop) offsets of each line of a buffer
+
+    Line endings (LF or CRLF) are left out of the spans, and with strip, so
+    is any other surrounding whitespace.
+    """
+    find = buf.find
+    size = len(buf)
+    start = 0
+    while start < size:
+        end = find(b'\n', start)
+        if end < 0:
+            end = size
+        lo, hi = start, end
+        if strip:
+            while lo < hi and buf[lo] in WHITESPACE:
+                lo += 1
+            while hi > lo and buf[hi - 1] in WHITESPACE:
+                hi -= 1
+        elif hi > lo and buf[hi - 1] == CR:
+            hi -= 1
+        yield lo, hi
+        start = end + 1
+
+
+def iter_lines(
+    buf: Buffer, *, strip: bool = False
+) -> Generator[memoryview, None, None]:
+    """Yield each line of a buffer as a memoryview slice of it
+
+    Nothing is copied or decoded.
+    """
+    with memoryview(buf) as view:
+        for start, stop in iter_line_spans(buf, strip=strip):
+            yield view[start:stop]
+
+
+@contextlib.contextmanager
+def mmap_file(path: Text) -> Iterator[Buffer]:
+    """Map a file read-only (an empty file gives an empty bytes object)"""
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            yield b''
+            return
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield m
+    finally:
+        try:
+            m.close()
+        except BufferError:
+            # Someone still holds a view; the map goes when they let go
+            pass
+
+
+def mmap_lines(
+    path: Text, *, strip: bool = False, copy: bool = False
+) -> Iterator[Union[memoryview, bytes]]:
+    """Yield each line of a file straight out of a memory map
+
+    Lines are memoryview slices of the map, not copies. A line kept after
+    the file has been read holds the whole map open until it's released;
+    pass copy to get bytes instead.
+    """
+    with mmap_file(path) as buf:
+        lines = iter_lines(buf, strip=strip)
+        try:
+            for line in lines:
+                yield line.tobytes() if copy else line
+        finally:
+            lines.close()
+
+
+def parse_int(value: Optional[Text], default: int = 0) -> int:
+    """An integer field ('3' or '3.0'), or default if it's empty or bad"""
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return int(float(value))
+        except ValueError:
+            return default
+
+
+def parse_float(value: Optional[Text], default: float = math.nan) -> float:
+    """A float field, or default (NaN) if it's empty or bad"""
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def parse_date(value: Text) -> date:
+    """A 'YYYY-MM-DD' date (date.fromisoformat is 3.7+)"""
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def date_range(start: date, end: date) -> Iterator[date]:
+    """Every day from start to end (inclusive)"""
+    for i in range((end - start).days + 1):
+        yield start + timedelta(days=i)
 
 
 F = TypeVar('F')
@@ -109,23 +248,44 @@ def make_frozen(*args: F) -> FrozenSet[F]:
 
 T = TypeVar('T')
 
+CLAIM_LEASE = 30.0  # seconds another process may spend fetching a value
+CLAIM_POLL = 0.1
+
 
 @attr.s(auto_attribs=True)
 class CachedValue(Generic[T]):
     """Encapsulates a value which is cached and periodically refreshed
 
         Pretty DIY compared to some solutions out there, but it works with
-    slotted 'attrs' classes.
+    slotted 'attrs' classes. Give each owner its own instance (use a
+    factory, not a shared default).
+
+        With a `backend`, loaded values are also written to (and picked up
+    from) that store under `key`, and a process only runs the loader once
+    it has claimed the key, so processes sharing a file or SQLite store
+    make one upstream fetch between them.
+
+        `get_or_load` is safe to call from several threads: only one of
+    them runs the loader at a time (the rest wait for its result), and
+    once a value has gone stale it keeps being served while a background
+    thread fetches the new one.
     """
 
     timeout: timedelta = attr.ib()  # TTL for value
     value: Optional[T] = attr.ib(default=None)  # The actual value
-    last: datetime = attr.ib(default=datetime.min)  # Last update time
+    last: float = attr.ib(default=-math.inf)  # Last update (monotonic)
+    # Optional shared store (see baseball_utils.cache) and our key in it
+    backend: Optional['CacheBackend'] = attr.ib(default=None, repr=False)
+    key: Text = attr.ib(default='')
+    _loading: bool = attr.ib(default=False, init=False, repr=False)
+    _cond: threading.Condition = attr.ib(
+        factory=threading.Condition, init=False, repr=False, eq=False
+    )
 
     @property
     def timed_out(self) -> bool:
         """Have we timed out?"""
-        return datetime.now() - self.last >= self.timeout
+        return time.monotonic() - self.last >= self.timeout.total_seconds()
 
     def is_none(self) -> bool:
         """Are we even storing a value?"""
@@ -136,9 +296,115 @@ class CachedValue(Generic[T]):
 
     def clear(self) -> None:
         """Reset the stored value to None"""
-        self.value = None
+        with self._cond:
+            self.value = None
 
     def refresh(self, val: T) -> None:
         """Reset last update time and set a new value"""
-        self.last = datetime.now()
-        self.value = val
+        with self._cond:
+            self.last = time.monotonic()
+            self.value = val
+        if self.backend is not None:
+            self.backend.put(self.key, val, self.timeout)
+
+    def get_or_load(self, load: Callable[[], T], stale_ok: bool = True) -> T:
+        """The cached value, calling load() if it's missing or timed out
+
+        :param stale_ok: return a timed out value straight away and
+            refresh it in the background, rather than waiting
+        """
+        if self.value is None or self.timed_out:
+            self._pull()
+        with self._cond:
+            while True:
+                if self.value is not None:
+                    if not self.timed_out:
+                        return self.value
+                    if stale_ok:
+                        if not self._loading:
+                            self._loading = True
+                            threading.Thread(
+                                target=self._load_quietly,
+                                args=(load,),
+                                daemon=True,
+                            ).start()
+                        return self.value
+                if not self._loading:
+                    self._loading = True
+                    break
+                self._cond.wait()
+        return self._load(load)
+
+    def _pull(self) -> None:
+        """Take a newer value from the backend, if it has one
+
+        The backend is read without holding the lock (so other readers
+        aren't stuck behind the disk); only the swap is done under it. An
+        unexpired entry counts as a hit; otherwise `_fetch` counts a hit or
+        a miss, depending on whether it has to load the value itself.
+        """
+        if self.backend is None:
+            return
+        entry = self.backend.peek(self.key)
+        if entry is None:
+            return
+        if not entry.expired:
+            self.backend.stats.record(True)
+        last = time.monotonic() - entry.age
+        with self._cond:
+            if self.value is None or last > self.last:
+                self.value, self.last = entry.value, last
+
+    def _fetch(self, load: Callable[[], T]) -> T:
+        backend = self.backend
+        if backend is None:
+            return load()
+
+        started = time.time()
+        deadline = time.monotonic() + CLAIM_LEASE
+        claimed = backend.claim(self.key, CLAIM_LEASE)
+        while not claimed and time.monotonic() < deadline:
+            # Someone else is fetching it; wait for their copy
+            time.sleep(CLAIM_POLL)
+            entry = backend.peek(self.key)
+            if entry is not None and entry.stored >= started:
+                backend.stats.record(True)
+                return entry.value
+            claimed = backend.claim(self.key, CLAIM_LEASE)
+        try:
+            if claimed:
+                # Whoever held the claim before us may have just stored it
+                entry = backend.peek(self.key)
+                if entry is not None and not entry.expired:
+                    backend.stats.record(True)
+                    return entry.value
+            backend.stats.record(False)
+            val = load()
+            backend.put(self.key, val, self.timeout)
+        finally:
+            if claimed:
+                backend.release(self.key)
+        return val
+
+    def _load(self, load: Callable[[], T]) -> T:
+        try:
+            val = self._fetch(load)
+        except BaseException:
+            with self._cond:
+                self._loading = False
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self.last = time.monotonic()
+            self.value = val
+            self._loading = False
+            self._cond.notify_all()
+        return val
+
+    def _load_quietly(self, load: Callable[[], T]) -> None:
+        # A failed background refresh keeps the stale value; the next
+        # caller tries again
+        try:
+            self._load(load)
+        except Exception:
+            pass
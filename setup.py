@@ -14,10 +14,12 @@ REQUIRES_PYTHON = '>=3.6.0'
 VERSION = None
 
 REQUIRED = [
-    'attrs>=18.1.0',
+    'aiohttp',
+    'attrs>=19.2.0',
     'click',
     'colorama',
     'lxml',
+    'numpy',
     'requests_html',
     'mypy',
     'mypy_extensions',
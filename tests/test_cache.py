@@ -0,0 +1,152 @@
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import attr
+import pytest
+
+from baseball_utils.cache import (
+    CacheBackend,
+    DiskCache,
+    FileCache,
+    MemoryCache,
+    SQLiteCache,
+)
+from baseball_utils.gameday import MASTER_TIMEOUT, final_after
+from baseball_utils.util import CachedValue, default_attrs
+
+
+def age(cache, key, seconds):
+    stamp = time.time() - seconds
+    os.utime(cache.path(key), (stamp, stamp))
+
+
+def test_entry_from_before_final_gets_ttl(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.put('k', b'in progress')
+    age(cache, 'k', 3600)
+    final = time.time() - 60  # became final after the entry was written
+    assert cache.get('k', MASTER_TIMEOUT, final) is None
+
+
+def test_entry_from_after_final_never_expires(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.put('k', b'final')
+    age(cache, 'k', 3600)
+    final = time.time() - 7200
+    assert cache.get('k', MASTER_TIMEOUT, final) == b'final'
+
+
+def test_recent_entry_is_served_before_final(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.put('k', b'live')
+    final = time.time() + 3600
+    assert cache.get('k', MASTER_TIMEOUT, final) == b'live'
+    age(cache, 'k', 120)
+    assert cache.get('k', MASTER_TIMEOUT, final) is None
+
+
+def test_final_after_is_past_the_end_of_the_day():
+    dt = datetime(2018, 6, 22, 19, 5)
+    final = datetime.fromtimestamp(final_after(dt))
+    assert final == datetime(2018, 6, 24)
+    assert final_after(datetime.today()) > time.time() + 86400 - 1
+    assert final_after(datetime.today() - timedelta(days=3)) < time.time()
+
+
+@default_attrs()
+class SlowCache(MemoryCache):
+    """A MemoryCache whose reads take a while"""
+
+    reading: threading.Event = attr.ib(factory=threading.Event)
+
+    def peek(self, key):
+        self.reading.set()
+        time.sleep(0.5)
+        return super().peek(key)
+
+
+def test_backend_needs_every_method():
+    @default_attrs()
+    class Partial(CacheBackend):
+        def peek(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_stats_count_every_thread():
+    cache = MemoryCache()
+    cache.put('k', 1, None)
+
+    def read():
+        for _ in range(1000):
+            cache.get('k')
+            cache.get('missing')
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert (cache.stats.hits, cache.stats.misses) == (8000, 8000)
+
+
+def test_backend_read_does_not_hold_the_lock():
+    backend = SlowCache()
+    backend.put('k', 'stored', None)
+    value = CachedValue(timedelta(minutes=1), backend=backend, key='k')
+    reader = threading.Thread(target=value.get_or_load, args=(lambda: 'x',))
+    reader.start()
+    assert backend.reading.wait(1)
+    acquired = value._cond.acquire(timeout=0.1)
+    if acquired:
+        value._cond.release()
+    reader.join()
+    assert acquired
+    assert value.get() == 'stored'
+
+
+class Renamed(object):
+    """Stands in for a class that an upgrade renames"""
+
+
+@pytest.fixture(params=['file', 'sqlite'])
+def shared(request, tmp_path):
+    if request.param == 'file':
+        return FileCache(str(tmp_path))
+    return SQLiteCache(str(tmp_path / 'values.sqlite'))
+
+
+def test_unloadable_entry_is_a_miss(shared, monkeypatch):
+    shared.put('k', Renamed(), None)
+    monkeypatch.delattr(sys.modules[__name__], 'Renamed')
+    assert shared.get('k') is None
+    assert shared.stats.misses == 1
+    # and it's gone, so the next load can replace it
+    monkeypatch.undo()
+    assert shared.peek('k') is None
+
+
+def test_stats_count_waiters_as_hits(shared):
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.3)
+        return 'fetched'
+
+    def owner():
+        value = CachedValue(timedelta(minutes=1), backend=shared, key='k')
+        assert value.get_or_load(load) == 'fetched'
+
+    threads = [threading.Thread(target=owner) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert (shared.stats.hits, shared.stats.misses) == (5, 1)
@@ -0,0 +1,203 @@
+import io
+import os
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from baseball_utils.const import Retrosheet
+from baseball_utils.download import (
+    Fetched,
+    fetch_resumable,
+    load_validators,
+    retrosheet_download,
+    save_validators,
+)
+from baseball_utils.http_client import HttpClient
+
+DATA = bytes(range(256)) * 1024  # 256 KB
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Serves DATA at any path, misbehaving as told by the server's plan
+
+    Each entry of `plan` is used for one request: 'fail' answers 503,
+    'truncate' sends half the body and hangs up, 'ok' behaves.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.seen.append(dict(self.headers))
+        step = server.plan.pop(0) if server.plan else 'ok'
+        if step == 'fail':
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        etag = server.etag
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        start = 0
+        rng = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if rng and (if_range is None or if_range == etag):
+            start = int(rng.split('=')[1].rstrip('-'))
+        body = server.data[start:]
+        self.send_response(206 if start else 200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        if start:
+            self.send_header(
+                'Content-Range',
+                'bytes {0}-{1}/{2}'.format(
+                    start, len(server.data) - 1, len(server.data)
+                ),
+            )
+        self.end_headers()
+        if step == 'truncate':
+            self.wfile.write(body[: len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(('127.0.0.1', 0), StandIn)
+    httpd.plan = []
+    httpd.seen = []
+    httpd.data = DATA
+    httpd.etag = '"v1"'
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield httpd
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def url(server):
+    return 'http://127.0.0.1:{0}/2017eve.zip'.format(server.server_port)
+
+
+def fetch(server, out_file, **kwargs):
+    session = HttpClient(rates={})
+    return fetch_resumable(url(server), out_file, session, backoff=0, **kwargs)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_retries_then_resumes_truncated_body(server, tmp_path):
+    out = str(tmp_path / '2017eve.zip')
+    server.plan = ['fail', 'truncate', 'ok']
+    assert fetch(server, out)
+    assert read(out) == DATA
+    assert not os.path.exists(out + '.part')
+
+    assert len(server.seen) == 3
+    assert 'Range' not in server.seen[1]
+    assert server.seen[2]['Range'].startswith('bytes=')
+    assert server.seen[2]['If-Range'] == '"v1"'
+    assert load_validators(out) == {'ETag': '"v1"'}
+
+
+def test_resumes_part_file(server, tmp_path):
+    out = str(tmp_path / '2017eve.zip')
+    with open(out + '.part', 'wb') as f:
+        f.write(DATA[:1000])
+    save_validators(out + '.part', {'ETag': '"v1"'})
+
+    assert fetch(server, out)
+    assert read(out) == DATA
+    assert server.seen[0]['Range'] == 'bytes=1000-'
+
+
+def test_stale_part_file_is_replaced(server, tmp_path):
+    out = str(tmp_path / '2017eve.zip')
+    with open(out + '.part', 'wb') as f:
+        f.write(b'old version')
+    save_validators(out + '.part', {'ETag': '"v0"'})
+
+    assert fetch(server, out)
+    assert read(out) == DATA
+
+
+def test_gives_up_after_retries(server, tmp_path):
+    out = str(tmp_path / '2017eve.zip')
+    server.plan = ['fail'] * 3
+    assert not fetch(server, out, retries=2)
+    assert not os.path.exists(out)
+
+
+def test_unchanged_file_costs_one_304(server, tmp_path):
+    out = str(tmp_path / '2017eve.zip')
+    assert fetch(server, out) is Fetched.DOWNLOADED
+    mtime = os.path.getmtime(out)
+
+    assert fetch(server, out) is Fetched.NOT_MODIFIED
+    assert server.seen[-1]['If-None-Match'] == '"v1"'
+    assert os.path.getmtime(out) == mtime
+    assert read(out) == DATA
+
+
+def test_changed_file_is_downloaded_again(server, tmp_path):
+    out = str(tmp_path / '2017eve.zip')
+    assert fetch(server, out)
+
+    server.data = DATA[::-1]
+    server.etag = '"v2"'
+    assert fetch(server, out) is Fetched.DOWNLOADED
+    assert read(out) == DATA[::-1]
+    assert load_validators(out) == {'ETag': '"v2"'}
+
+
+def event_zip(text):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as z:
+        z.writestr('2017TST.EVA', text)
+    return buf.getvalue()
+
+
+def test_unchanged_archive_is_not_extracted_again(
+    server, tmp_path, monkeypatch
+):
+    base = 'http://127.0.0.1:{0}'.format(server.server_port)
+    monkeypatch.setattr(Retrosheet, 'eve_base', base)
+    zip_dir, data_dir = str(tmp_path / 'raw'), str(tmp_path / 'data')
+    os.makedirs(zip_dir)
+    server.data = event_zip('id,TST201704010\n')
+
+    def download():
+        session = HttpClient(rates={})
+        return retrosheet_download(
+            [2017], zip_dir, data_dir, force=True, session=session
+        )
+
+    [folder] = download()
+    member = os.path.join(folder, '2017TST.EVA')
+    # Marks the extracted file, so extracting again would show
+    with open(member, 'a') as f:
+        f.write('local\n')
+
+    assert download() == [folder]
+    assert server.seen[-1]['If-None-Match'] == '"v1"'
+    assert read(member).endswith(b'local\n')
+
+    server.data = event_zip('id,TST201704020\n')
+    server.etag = '"v2"'
+    assert download() == [folder]
+    assert read(member) == b'id,TST201704020\n'
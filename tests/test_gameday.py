@@ -0,0 +1,95 @@
+import threading
+from collections import Counter
+from datetime import date
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+
+from baseball_utils.cache import DiskCache
+from baseball_utils.gameday import INNING_FILE, GamedayData
+from baseball_utils.gameday_pitches import pitch_store
+from baseball_utils.gameday_xml import parse_scoreboard
+
+from .test_gameday_xml import SCOREBOARD
+
+INNING_ALL = b'''<game atBat="1" ind="F">
+<inning num="1" away_team="a" home_team="h" next="Y">
+<top><atbat num="1" b="1" s="2" o="1" batter="1" pitcher="2" event="K">
+<pitch des="Ball" type="B" start_speed="95.1" pitch_type="FF" zone="14"/>
+<pitch des="Called Strike" type="S" start_speed="84.0" pitch_type="SL"/>
+<pitch des="Swinging Strike" type="S" start_speed="85.0" pitch_type="SL"/>
+</atbat></top></inning></game>
+'''
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Serves INNING_ALL for every game's inning file, counting requests"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.asked[self.path] += 1
+        if self.path.endswith(INNING_FILE):
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(INNING_ALL)))
+            self.end_headers()
+            self.wfile.write(INNING_ALL)
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    httpd = HTTPServer(('127.0.0.1', 0), StandIn)
+    httpd.asked = Counter()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    base = 'http://127.0.0.1:{0}'.format(httpd.server_port)
+    monkeypatch.setattr(GamedayData, 'gd_base', base)
+    games = parse_scoreboard(SCOREBOARD)
+    monkeypatch.setattr(GamedayData, 'scoreboard', property(lambda _: games))
+    try:
+        yield httpd
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+@pytest.fixture
+def gameday(server, tmp_path):
+    return GamedayData(
+        requests.Session(),
+        None,
+        date(2018, 6, 22),
+        http_cache=DiskCache(str(tmp_path / 'http')),
+    )
+
+
+def test_boxscores_of_started_games(server, gameday):
+    boxes = list(gameday.boxscores())
+    # The pregame game isn't fetched
+    assert [box.game_id for box in boxes] == [
+        '2018/06/22/nyamlb-tbamlb-1',
+        '2018/06/22/bosmlb-minmlb-1',
+    ]
+    assert all(len(box.pitches) == 3 for box in boxes)
+    assert len(server.asked) == 2
+
+    # Only the game that's still going is fetched again
+    list(gameday.boxscores())
+    assert sorted(server.asked.values()) == [1, 2]
+
+
+def test_store_pitches_fetches_only_new_final_games(server, gameday, tmp_path):
+    store = pitch_store(str(tmp_path / 'pitches'))
+    assert gameday.store_pitches(store) == 3
+    assert [p[0] for p in store.partitions] == ['2018/06/22/nyamlb-tbamlb-1']
+    assert sum(server.asked.values()) == 1
+
+    gameday.http_cache = None
+    assert gameday.store_pitches(store) == 0
+    assert sum(server.asked.values()) == 1
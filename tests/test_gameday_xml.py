@@ -0,0 +1,80 @@
+from baseball_utils.gameday_xml import NOT_PLAYED, parse_scoreboard
+
+SCOREBOARD = b'''<?xml version="1.0" encoding="UTF-8"?>
+<games year="2018" month="06" day="22" modified_date="2018-06-23T04:12:03Z">
+  <game id="2018/06/22/nyamlb-tbamlb-1" away_team_name="Yankees"
+        home_team_name="Rays"
+        game_data_directory="DAY/gid_2018_06_22_nyamlb_tbamlb_1">
+    <status status="Final" ind="F" inning="9" top_inning="N" o="3" b="1"
+            s="2"/>
+    <linescore>
+      <inning away="0" home="1"/>
+      <inning away="2" home="0"/>
+      <inning away="1" home=""/>
+      <r away="3" home="1" diff="2"/>
+      <h away="8" home="5"/>
+      <e away="0" home="1"/>
+    </linescore>
+    <links wrapup="/gameday/nyamlb-tbamlb-1/wrap"/>
+  </game>
+  <game id="2018/06/22/bosmlb-minmlb-1" away_team_name="Red Sox"
+        home_team_name="Twins"
+        game_data_directory="DAY/gid_2018_06_22_bosmlb_minmlb_1">
+    <status status="In Progress" ind="I" inning="5" top_inning="Y" o="1"
+            b="2" s="0"/>
+    <linescore>
+      <inning away="0" home="0"/>
+      <inning away="3" home="1"/>
+      <inning away="0" home="0"/>
+      <inning away="1" home="2"/>
+      <inning away="0"/>
+      <r away="4" home="3"/>
+      <h away="6" home="7"/>
+      <e away="1" home="0"/>
+    </linescore>
+    <broadcast>
+      <home><status ind="X" status="Blackout"/></home>
+    </broadcast>
+  </game>
+  <game id="2018/06/22/lanmlb-sfnmlb-1" away_team_name="Dodgers"
+        home_team_name="Giants"
+        game_data_directory="DAY/gid_2018_06_22_lanmlb_sfnmlb_1">
+    <game_media><media><status ind="P"/></media></game_media>
+    <status status="Preview" ind="S" inning="0" top_inning="Y" o="0" b="0"
+            s="0"/>
+  </game>
+</games>
+'''.replace(
+    b'DAY/', b'/components/game/mlb/year_2018/month_06/day_22/'
+)
+
+
+def test_streaming_matches_soup():
+    streamed = parse_scoreboard(SCOREBOARD)
+    souped = parse_scoreboard(SCOREBOARD, streaming=False)
+    assert [g.id for g in streamed] == [
+        '2018/06/22/nyamlb-tbamlb-1',
+        '2018/06/22/bosmlb-minmlb-1',
+        '2018/06/22/lanmlb-sfnmlb-1',
+    ]
+    assert streamed == souped
+
+
+def test_scoreboard_records():
+    final, live, pregame = parse_scoreboard(SCOREBOARD)
+
+    assert final.status.is_final
+    assert not final.status.top_inning
+    assert final.linescore.innings == [(0, 1), (2, 0), (1, NOT_PLAYED)]
+    assert final.linescore.runs == (3, 1)
+    assert final.linescore.total('e') == (0, 1)
+    assert final.game_data_directory.endswith('gid_2018_06_22_nyamlb_tbamlb_1')
+
+    # The broadcast's <status> isn't the game's
+    assert live.status.in_progress
+    assert (live.status.inning, live.status.outs) == (5, 1)
+    assert len(live.linescore.innings) == 4
+    assert live.linescore.hits == (6, 7)
+
+    assert pregame.status.ind == 'S'
+    assert pregame.linescore is None
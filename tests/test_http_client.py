@@ -0,0 +1,74 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from baseball_utils import http_client, util
+from baseball_utils.http_client import HttpClient
+
+
+class Flaky(BaseHTTPRequestHandler):
+    """Answers 503 to the first `failures` requests, then 200"""
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self):
+        server = self.server
+        server.calls.append(self.command)
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        status = 503 if len(server.calls) <= server.failures else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = do_POST = respond
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(('127.0.0.1', 0), Flaky)
+    httpd.calls = []
+    httpd.failures = 1
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield httpd
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def client_and_url(server):
+    url = 'http://127.0.0.1:{0}/'.format(server.server_port)
+    return HttpClient(rates={}, backoff=0), url
+
+
+def test_get_is_retried(server):
+    client, url = client_and_url(server)
+    assert client.get(url).status_code == 200
+    assert server.calls == ['GET', 'GET']
+
+
+def test_post_is_not_retried(server):
+    client, url = client_and_url(server)
+    assert client.post(url, data={'a': 1}).status_code == 503
+    assert server.calls == ['POST']
+
+
+def test_post_retried_when_asked(server):
+    client, url = client_and_url(server)
+    assert client.post(url, data={'a': 1}, retry=True).status_code == 200
+    assert server.calls == ['POST', 'POST']
+
+
+def test_get_retry_can_be_turned_off(server):
+    client, url = client_and_url(server)
+    assert client.get(url, retry=False).status_code == 503
+    assert server.calls == ['GET']
+
+
+def test_util_session_alias():
+    assert util.SESSION is http_client.SESSION
+    assert isinstance(util.SESSION, HttpClient)
@@ -0,0 +1,152 @@
+import os
+import time
+import zipfile
+
+import attr
+import numpy as np
+import pytest
+
+from baseball_utils.const import Retrosheet
+from baseball_utils.play_table import GameTable, PlayTable
+from baseball_utils.retro_collect import RetrosheetData, parse_files
+
+
+def write_archives(zip_dir):
+    os.makedirs(zip_dir)
+    for year in Retrosheet.years:
+        path = os.path.join(zip_dir, '{0}eve.zip'.format(year))
+        with zipfile.ZipFile(path, 'w') as z:
+            z.writestr(
+                '{0}TST.EVA'.format(year),
+                'id,TST{0}04010\ninfo,visteam,AAA\n'.format(year),
+            )
+
+
+def test_sync_keeps_every_season(tmp_path):
+    root = str(tmp_path)
+    write_archives(os.path.join(root, 'events', 'raw'))
+    data = RetrosheetData(root, unzip=False, cache=False)
+    data.sync(2015, 2016, download=False)
+    assert sorted(data.years) == sorted(Retrosheet.years)
+
+
+def season_text(games, plays, team='TST'):
+    """Event file text for a season of games that each have `plays` plays"""
+    events = ('S8/G', '63/G.1-2', 'K', 'W', 'HR/F89.1-H;2-H(UR)', 'E6/G.B-1')
+    lines = []
+    for g in range(games):
+        lines += [
+            'id,{0}2017{1:04d}0'.format(team, g),
+            'version,2',
+            'info,visteam,AAA',
+            'info,hometeam,{0}'.format(team),
+            'info,date,2017/04/{0:02d}'.format(g % 28 + 1),
+            'info,starttime,7:05PM',
+            'info,daynight,night',
+            'info,temp,{0}'.format(60 + g % 20),
+        ]
+        for side in (0, 1):
+            lines += [
+                'start,p{0}{1},"Player {1}",{0},{1},{1}'.format(side, b)
+                for b in range(1, 10)
+            ]
+        lines.append('sub,subs001,"Sub Player",1,0,1')
+        for n in range(plays):
+            count = '??' if n % 7 == 0 else '{0}{1}'.format(n % 4, n % 3)
+            lines.append(
+                'play,{0},{1},p{1}{2},{3},{4},{5}'.format(
+                    n // 6 + 1,
+                    n // 3 % 2,
+                    n % 9 + 1,
+                    count,
+                    'BCFSX'[: n % 6],
+                    events[(n + g) % len(events)],
+                )
+            )
+            if n % 11 == 0:
+                lines.append('com,"$note {0}"'.format(n))
+        lines += ['com,"game over"', 'data,er,subs001,2']
+    return '\n'.join(lines) + '\n'
+
+
+def write_season(root, games, plays, files=1):
+    folder = os.path.join(root, '2017')
+    os.makedirs(folder)
+    for i in range(files):
+        team = 'T{0:02d}'.format(i)
+        path = os.path.join(folder, '2017{0}.EVA'.format(team))
+        with open(path, 'w') as f:
+            f.write(season_text(games, plays, team))
+    return folder
+
+
+@pytest.fixture
+def season(tmp_path, monkeypatch):
+    """RetrosheetData for a single season of event files on disk"""
+    root = str(tmp_path)
+    folder = write_season(os.path.join(root, 'data'), 20, 30, files=3)
+    monkeypatch.setattr(RetrosheetData, 'year_dirs', [folder])
+    return root
+
+
+def test_game_table_round_trip(season):
+    data = RetrosheetData(season, cache=False)
+    games = data.games(2017)
+    assert any(p.com for g in games for p in g.plays)
+    assert any(p.count is None for g in games for p in g.plays)
+    assert any(p.pitches is None for g in games for p in g.plays)
+    plays = PlayTable.from_games(games)
+    assert GameTable.from_games(games).to_games(plays) == games
+
+
+def test_warm_start_matches_parse(season):
+    cold = RetrosheetData(season)
+    games = cold.games(2017)
+    assert os.path.isfile(cold.cache_file(2017))
+
+    warm = RetrosheetData(season)
+    assert warm.load_cached(2017)
+    assert warm.games(2017) == games
+    cached = RetrosheetData(season).play_table(2017)
+    parsed = PlayTable.from_games(games)
+    for a in attr.fields(PlayTable):
+        assert np.array_equal(getattr(cached, a.name), getattr(parsed, a.name))
+
+
+def test_changed_file_is_parsed_again(season):
+    data = RetrosheetData(season)
+    data.games(2017)
+    path = data.event_files(2017)[1]
+    with open(path, 'w') as f:
+        f.write(season_text(2, 5, 'T01'))
+
+    data = RetrosheetData(season)
+    assert data.cached_play_table(2017) is None
+    assert data.load_seasons([2017]) == {2017: [path]}
+    assert len(data.games(2017)) == 20 + 2 + 20
+
+
+def test_warm_start_beats_parse(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    folder = write_season(os.path.join(root, 'data'), 100, 80, files=2)
+    monkeypatch.setattr(RetrosheetData, 'year_dirs', [folder])
+    data = RetrosheetData(root)
+    sources = data.event_files(2017)
+    data.games(2017)
+
+    def best(run):
+        times = []
+        for _ in range(3):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    parse = best(lambda: parse_files(sources))
+    warm = best(lambda: RetrosheetData(root).games(2017))
+    assert warm < parse
+
+
+def test_parallel_parse_matches_serial(season):
+    sources = RetrosheetData(season).event_files(2017)
+    assert parse_files(sources, jobs=2) == parse_files(sources)
@@ -0,0 +1,72 @@
+import zipfile
+
+from baseball_utils.retrosheet import (
+    Advance,
+    index_event_file,
+    parse_event,
+    read_game,
+    split_outside_parens,
+)
+
+EVENTS = (
+    'id,NYA201704020\n'
+    'version,2\n'
+    'info,visteam,TBA\n'
+    'play,1,0,kierk001,01,CX,8/F\n'
+    'id,NYA201704030\n'
+    'version,2\n'
+    'info,visteam,BAL\n'
+    'play,1,0,jonea003,00,X,S7/L\n'
+)
+
+
+def test_split_outside_parens():
+    assert split_outside_parens('K+PO1(E2/TH)/G', '/') == ['K+PO1(E2/TH)', 'G']
+    assert split_outside_parens('a.b.c', '.', 1) == ['a', 'b.c']
+    assert split_outside_parens('2-H(E8/TH);1-3', ';') == ['2-H(E8/TH)', '1-3']
+
+
+def test_error_inside_parens_is_not_a_modifier():
+    event = parse_event('K+PO1(E2/TH)')
+    assert event.code == 'K'
+    assert event.basic == 'K'
+    assert event.extra == 'PO1(E2/TH)'
+    assert event.modifiers == ()
+
+
+def test_modifiers_after_parens():
+    event = parse_event('K+PO1(E2/TH)/DP.B-1')
+    assert event.extra == 'PO1(E2/TH)'
+    assert event.modifiers == ('DP',)
+    assert event.advances == (Advance('B', '1'),)
+
+
+def test_advance_with_error_and_throw():
+    event = parse_event('S8/L8.2-H(E8/TH)(UR);1-3')
+    assert event.code == 'S'
+    assert event.fielders == (8,)
+    assert event.modifiers == ('L8',)
+    assert event.advances == (
+        Advance('2', 'H', False, ('E8/TH', 'UR')),
+        Advance('1', '3'),
+    )
+
+
+def test_plain_events():
+    event = parse_event('63/G6.1-2')
+    assert event.code == 'O'
+    assert event.fielders == (6, 3)
+    assert event.modifiers == ('G6',)
+    assert event.advances == (Advance('1', '2'),)
+    assert parse_event('W').is_walk
+
+
+def test_read_game_from_zip(tmp_path):
+    path = str(tmp_path / '2017eve.zip')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('2017NYA.EVA', EVENTS)
+    source = (path, '2017NYA.EVA')
+    index = index_event_file(source)
+    assert list(index) == ['NYA201704020', 'NYA201704030']
+    assert read_game(source, index['NYA201704030']).info.visit_team == 'BAL'
+    assert read_game(source, index['NYA201704020']).info.visit_team == 'TBA'
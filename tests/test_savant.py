@@ -0,0 +1,68 @@
+import pytest
+
+from baseball_utils.savant import NameIndex, normalize
+
+IDS = {
+    '592450': ('Judge', 'Aaron'),
+    '665161': ('Peña', 'Jeremy'),
+    '660271': ('Ohtani', 'Shohei'),
+    '543037': ('Cole', 'Gerrit'),
+    '519242': ('Sale', 'Chris'),
+    '641355': ('Bellinger', 'Cody'),
+    '663656': ('Tucker', 'Kyle'),
+    '643217': ('Tucker', 'Preston'),
+}
+
+
+@pytest.fixture(scope='module')
+def index():
+    return NameIndex.from_ids(IDS)
+
+
+def test_normalize():
+    assert normalize('  Peña,  Jeremy ') == 'pena jeremy'
+    assert normalize("O'Neill") == 'oneill'
+
+
+def test_lookup_either_order(index):
+    assert index.lookup('Aaron Judge') == ['592450']
+    assert index.lookup('judge aaron') == ['592450']
+    assert index.lookup('Judge, Aaron') == ['592450']
+    assert index.lookup('Aaron') == []
+
+
+def test_lookup_accented_names(index):
+    assert index.lookup('Jeremy Pena') == ['665161']
+    assert index.lookup('Jeremy Peña') == ['665161']
+
+
+def test_prefix(index):
+    assert index.prefix('tuck') == ['663656', '643217']
+    assert index.prefix('tucker p') == ['643217']
+    assert index.prefix('tuck', limit=1) == ['663656']
+    assert index.prefix('co') == ['641355', '543037']
+
+
+def test_prefix_past_the_last_key(index):
+    assert index.prefix('zz') == []
+    # 'tucker preston' is the last key
+    assert index.prefix('tucker preston') == ['643217']
+    assert index.prefix('tucker prestonn') == []
+
+
+def test_fuzzy_ranking_and_cutoff(index):
+    assert index.fuzzy('Shohei Otani')[0] == '660271'
+    assert index.fuzzy('arron judg')[0] == '592450'
+    # Only Kyle passes the default cutoff; a lower one lets Preston in
+    # after him
+    assert index.fuzzy('Kyle Tuckr') == ['663656']
+    assert index.fuzzy('Kyle Tuckr', cutoff=0.55) == ['663656', '643217']
+    assert index.fuzzy('Kyle Tuckr', cutoff=0.99) == []
+    assert index.fuzzy('xqzw vbnm') == []
+
+
+def test_search_order(index):
+    # Exact matches come first, then prefixes, then fuzzy matches
+    assert index.search('Chris Sale') == ['519242']
+    assert index.search('tucker')[:2] == ['663656', '643217']
+    assert index.search('Gerit Cole', limit=1) == ['543037']
@@ -0,0 +1,133 @@
+import csv
+import io
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from baseball_utils.savant import Savant
+from baseball_utils.statcast_collect import (
+    STATCAST_COLUMNS,
+    STATCAST_SOURCES,
+    StatcastCollector,
+    statcast_store,
+)
+from baseball_utils.util import date_range
+
+GAME_DAYS = {date(2018, 5, 1), date(2018, 5, 2), date(2018, 5, 3)}
+PITCHES = 4  # per game day
+HEADER = [STATCAST_SOURCES.get(name, name) for name in STATCAST_COLUMNS]
+
+
+def row(day, n):
+    values = {
+        'game_date': day.isoformat(),
+        'game_pk': str(day.toordinal()),
+        'at_bat_number': str(n + 1),
+        'inning_topbot': 'Top',
+    }
+    for name, dtype in STATCAST_COLUMNS.items():
+        if name not in values and name != 'top':
+            values[name] = '90.5' if dtype.startswith('f') else '1'
+    return [values.get(name, 'X') for name in HEADER]
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Savant's CSV search: PITCHES rows for each game day asked for
+
+    With the server's `empty` set, the body is empty (not even a header).
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        first, last = (
+            date(*map(int, query[k][0].split('-')))
+            for k in ('game_date_gt', 'game_date_lt')
+        )
+        self.server.asked.append((first, last))
+        out = io.StringIO()
+        writer = csv.writer(out)
+        if not self.server.empty:
+            writer.writerow(HEADER)
+            for day in date_range(first, last):
+                if day in GAME_DAYS:
+                    writer.writerows(row(day, n) for n in range(PITCHES))
+        body = out.getvalue().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    httpd = HTTPServer(('127.0.0.1', 0), StandIn)
+    httpd.asked = []
+    httpd.empty = False
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    url = 'http://127.0.0.1:{0}/statcast_search'.format(httpd.server_port)
+    monkeypatch.setattr(Savant, 'url', url)
+    try:
+        yield httpd
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+@pytest.fixture
+def collector(server, tmp_path):
+    savant = Savant(requests.Session())
+    store = statcast_store(str(tmp_path / 'statcast'))
+    return StatcastCollector(savant, store, workers=2, window_days=2)
+
+
+def test_sync_over_off_days_adds_nothing_twice(server, collector):
+    store = collector.store
+    collector.collect(date(2018, 5, 1), date(2018, 5, 2))
+    assert collector.sync(end=date(2018, 5, 6)) == PITCHES
+    assert collector.through == date(2018, 5, 6)
+    partitions = store.partitions
+    # The window without pitches (05-05 to 05-06) isn't stored
+    assert [p[0] for p in partitions] == [
+        '2018-05-01_2018-05-02',
+        '2018-05-03_2018-05-04',
+    ]
+
+    asked = len(server.asked)
+    assert collector.sync(end=date(2018, 5, 6)) == 0
+    assert len(server.asked) == asked
+    assert collector.sync(end=date(2018, 5, 7)) == 0
+    assert server.asked[asked:] == [(date(2018, 5, 7), date(2018, 5, 7))]
+    assert collector.through == date(2018, 5, 7)
+    assert store.partitions == partitions
+
+    keys = set(
+        zip(store.column('game_pk').tolist(), store.column('at_bat_number'))
+    )
+    assert len(store) == len(keys) == PITCHES * len(GAME_DAYS)
+
+
+def test_sync_skips_days_already_collected(server, collector):
+    store = collector.store
+    collector.sync(start=date(2018, 5, 1), end=date(2018, 5, 1))
+    collector.collect(date(2018, 5, 2), date(2018, 5, 4))
+    partitions = store.partitions
+
+    assert collector.through == date(2018, 5, 1)
+    assert collector.sync(end=date(2018, 5, 4)) == 0
+    assert store.partitions == partitions
+    assert len(store) == PITCHES * len(GAME_DAYS)
+
+
+def test_collect_empty_response(server, collector):
+    server.empty = True
+    assert collector.collect(date(2018, 5, 1), date(2018, 5, 2)) == 0
+    assert collector.store.partitions == [('2018-05-01_2018-05-02', 0, 0)]
+    assert len(collector.store) == 0
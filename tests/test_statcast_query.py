@@ -0,0 +1,143 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from baseball_utils.gameday_pitches import (
+    STORE_COLUMNS,
+    STORE_STRINGS,
+    pitch_store,
+)
+from baseball_utils.statcast_collect import (
+    STATCAST_COLUMNS,
+    STATCAST_STRINGS,
+    statcast_store,
+)
+from baseball_utils.statcast_query import PitchQuery
+
+ROWS = 2000
+DESCRIPTIONS = ['ball', 'called_strike', 'swinging_strike', 'foul']
+
+
+def random_columns(schema, strings, tables, rng):
+    columns = dict()
+    for name, dtype in schema.items():
+        kind = np.dtype(dtype).kind
+        if name in strings:
+            values = rng.integers(0, len(tables[name]), ROWS)
+        elif kind == 'f':
+            values = rng.normal(90, 5, ROWS)
+            values[rng.random(ROWS) < 0.1] = np.nan
+        elif kind == 'M':
+            days = rng.integers(17600, 17650, ROWS)
+            values = days.astype('M8[D]')
+        elif kind == 'b':
+            values = rng.random(ROWS) < 0.5
+        else:
+            values = rng.integers(0, 15, ROWS)
+        columns[name] = values.astype(dtype)
+    # Player ids are too sparse for bincount
+    columns['pitcher'] = rng.integers(400000, 700000, ROWS).astype('i4')
+    columns['pitcher'][: ROWS // 2] = 543037  # and one of them repeats
+    return columns
+
+
+@pytest.fixture
+def query(tmp_path):
+    rng = np.random.default_rng(7)
+    tables = {name: ['a', 'b', 'c'] for name in STATCAST_STRINGS}
+    tables['description'] = DESCRIPTIONS
+    store = statcast_store(str(tmp_path / 'statcast'))
+    columns = random_columns(STATCAST_COLUMNS, STATCAST_STRINGS, tables, rng)
+    store.append('all', columns, tables)
+    return PitchQuery(store)
+
+
+def naive(query, by, value, how):
+    groups = defaultdict(list)
+    values = query.values(value) if value else [1.0] * len(query)
+    for key, v in zip(query.values(by).tolist(), list(values)):
+        if how == 'count' or not np.isnan(v):
+            groups[key].append(float(v))
+    aggregate = {
+        'count': len,
+        'sum': sum,
+        'mean': lambda vs: sum(vs) / len(vs),
+        'min': min,
+        'max': max,
+    }[how]
+    return {k: aggregate(vs) for k, vs in groups.items() if vs}
+
+
+def check(got, want):
+    assert set(got) == set(want)
+    for key, value in want.items():
+        assert got[key] == pytest.approx(value)
+
+
+@pytest.mark.parametrize('how', ['count', 'sum', 'mean'])
+def test_bincount_matches_naive(query, how):
+    value = None if how == 'count' else 'release_speed'
+    got = query.group('zone', value, how)
+    want = naive(query, 'zone', value, how)
+    check(got, want)
+
+
+@pytest.mark.parametrize('how', ['count', 'sum', 'mean', 'min', 'max'])
+def test_reduceat_matches_naive(query, how):
+    value = None if how == 'count' else 'release_speed'
+    got = query.group('pitcher', value, how)
+    check(got, naive(query, 'pitcher', value, how))
+    # min and max of small keys go through reduceat too
+    check(
+        query.group('zone', value, how), naive(query, 'zone', value, how)
+    )
+
+
+def test_groups_of_filtered_rows(query):
+    sub = query.where('zone', 1, 2, 3).count(balls=0)
+    got = sub.group('pitcher', 'release_speed', 'mean')
+    check(got, naive(sub, 'pitcher', 'release_speed', 'mean'))
+
+
+def test_date_groups_are_dates(query):
+    got = query.group('game_date', how='count')
+    assert sum(got.values()) == ROWS
+    assert {type(k).__name__ for k in got} == {'date'}
+
+
+@pytest.mark.parametrize('how', ['sum', 'mean', 'min', 'max'])
+def test_aggregate_needs_a_value(query, how):
+    with pytest.raises(ValueError):
+        query.group('zone', how=how)
+
+
+def test_unknown_aggregate(query):
+    with pytest.raises(ValueError):
+        query.group('zone', 'release_speed', 'median')
+
+
+def test_whiff_rate(query):
+    rates = query.whiff_rate('zone')
+    zone = query.values('zone')
+    desc = query.values('description')
+    for z, rate in rates.items():
+        swings = desc[zone == z] >= 2
+        misses = desc[zone == z] == 2
+        assert rate == pytest.approx(misses.sum() / swings.sum())
+
+
+def test_gameday_whiff_rate(tmp_path):
+    rng = np.random.default_rng(11)
+    tables = {name: ['x'] for name in STORE_STRINGS}
+    tables['des'] = ['Ball', 'Swinging Strike', 'Foul', 'In play, no out']
+    store = pitch_store(str(tmp_path / 'gameday'))
+    columns = random_columns(STORE_COLUMNS, STORE_STRINGS, tables, rng)
+    store.append('game', columns, tables)
+    query = PitchQuery(store)
+    des = query.values('des')
+    rates = query.whiff_rate('top', name='des')
+    assert rates
+    for top, rate in rates.items():
+        rows = des[query.values('top') == top]
+        assert rate == pytest.approx((rows == 1).sum() / (rows >= 1).sum())